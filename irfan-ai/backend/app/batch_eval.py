@@ -0,0 +1,87 @@
+"""Offline batch evaluation through the same pipeline as ``POST /api/irfan/chat/batch``.
+
+Reads questions from a text file (one per line) or JSONL (``{"query": ...}`` per line), answers
+them with batched guardrails/embeddings/retrieval and bounded LLM concurrency, and writes one
+NDJSON result per question to stdout (or ``--out``) as answers complete.
+
+    python -m backend.app.batch_eval questions.txt > answers.ndjson
+    python -m backend.app.batch_eval questions.jsonl --language tr --concurrency 32 --out answers.ndjson
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from contextlib import aclosing, redirect_stdout
+from typing import List
+
+from .llm import close_llm_client
+from .routers.chat import run_chat_batch
+from .schemas import BatchChatRequest
+from .startup import get_startup_state, warm_up
+from .utils.sse import dumps
+
+
+def read_queries(path: str) -> List[str]:
+    queries: List[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                line = str(json.loads(line)["query"]).strip()
+            queries.append(line)
+    return queries
+
+
+async def _run(req: BatchChatRequest, out) -> int:
+    done = 0
+    try:
+        async with aclosing(run_chat_batch(req)) as results:
+            async for result in results:
+                out.write(dumps(result.model_dump()) + b"\n")
+                done += 1
+    finally:
+        await close_llm_client()
+    return done
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("path", help="questions (.txt: one per line, .jsonl: {\"query\": ...})")
+    ap.add_argument("--language", choices=["both", "tr", "ar", "auto"], default="both")
+    ap.add_argument("--concurrency", type=int, default=None, help="concurrent LLM calls (default BATCH_LLM_CONCURRENCY)")
+    ap.add_argument("--temperature", type=float, default=0.2)
+    ap.add_argument("--max-tokens", type=int, default=4096)
+    ap.add_argument("--out", default=None, help="NDJSON output file (default stdout)")
+    args = ap.parse_args(argv)
+
+    queries = read_queries(args.path)
+    if not queries:
+        ap.error("no questions in input")
+    # Indexes are brought up to date once, exactly as on server startup; its log lines must not mix into the NDJSON
+    with redirect_stdout(sys.stderr):
+        warm_up()
+    state = get_startup_state()
+    if not state.ready:
+        sys.exit(f"index warm-up failed: {state.error}")
+
+    req = BatchChatRequest(
+        queries=queries, language=args.language, concurrency=args.concurrency,
+        temperature=args.temperature, max_tokens=args.max_tokens,
+    )
+    t0 = time.perf_counter()
+    if args.out:
+        with open(args.out, "wb") as out:
+            done = asyncio.run(_run(req, out))
+    else:
+        done = asyncio.run(_run(req, sys.stdout.buffer))
+    elapsed = time.perf_counter() - t0
+    print(f"{done} answers in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
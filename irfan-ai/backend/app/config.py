@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import List
+from typing import List, Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -15,11 +15,114 @@ class Settings(BaseSettings):
     hf_api_base: str = Field(default="https://router.huggingface.co/v1")
     model: str = Field(default="openai/gpt-oss-120b:novita")
 
+    # Shared async LLM client: pooled keep-alive connections to the router
+    llm_max_connections: int = 200
+    llm_max_keepalive_connections: int = 50
+    llm_keepalive_expiry: float = 30.0
+    llm_timeout: float = 120.0
+    llm_connect_timeout: float = 10.0
+    llm_max_retries: int = 2
+
+    # SSE streaming: upstream deltas are merged into one frame per interval / size budget (0 ms = a frame per delta)
+    sse_flush_interval_ms: float = 50.0
+    sse_flush_max_chars: int = 512
+    # Streamed answers are markdown-cleaned incrementally; a delta waits at most this many characters for a safe cut
+    markdown_stream_buffer_chars: int = 4096
+
     # Generation defaults
     temperature: float = 0.2
     top_p: float = 0.95
     max_tokens: int = 512
 
+    # Embedding cache (content-addressed, memory-mapped under app_data/emb_cache)
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 500_000
+
+    # Query embedding micro-batching + LRU of recent query vectors
+    query_embed_max_batch: int = 32
+    query_embed_max_wait_ms: float = 5.0
+    query_embed_lru_size: int = 4096
+
+    # Vector index: flat (exact) | ivf | hnsw; corpora below vector_index_min_size always use flat
+    vector_index_type: Literal["flat", "ivf", "hnsw"] = "flat"
+    vector_index_min_size: int = 20_000
+    vector_ivf_nlist: int = 0  # 0 -> 4 * sqrt(N)
+    vector_ivf_nprobe: int = 16
+    vector_hnsw_m: int = 32
+    vector_hnsw_ef_construction: int = 80
+    vector_hnsw_ef_search: int = 64
+    # Vector encoding: none (float32) | fp16 | sq8 (int8 scalar) | pq (product quantizer, falls back to sq8 on small corpora)
+    vector_quantization: Literal["none", "fp16", "sq8", "pq"] = "none"
+    vector_pq_m: int = 48
+    # Re-score quantized candidates (k * factor) with exact float vectors from the embedding cache
+    vector_rescore: bool = True
+    vector_rescore_factor: int = 4
+
+    # Answer cache: exact (normalized query + language + categories) and optional embedding-similarity tier;
+    # emptied whenever the index generation changes
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 2048
+    answer_cache_ttl_seconds: float = 3600.0
+    answer_cache_semantic: bool = False
+    answer_cache_semantic_threshold: float = 0.95
+
+    # Retrieval result cache: merged top-k hit ids per (query, categories, k); emptied when indexes are rebuilt
+    retrieval_cache_enabled: bool = True
+    retrieval_cache_max_entries: int = 10_000
+    retrieval_cache_max_bytes: int = 16 * 1024 * 1024
+
+    # Hybrid retrieval: dense + BM25 searched concurrently over k * candidate_factor candidates each, then fused
+    # by reciprocal rank (rrf) or min-max normalized scores (score, weighted by hybrid_dense_weight)
+    hybrid_fusion: Literal["rrf", "score"] = "rrf"
+    hybrid_rrf_k: int = 60
+    hybrid_candidate_factor: int = 4
+    hybrid_dense_weight: float = 0.5
+    hybrid_max_workers: int = 4
+
+    # Batch chat (/api/irfan/chat/batch): max questions per request and concurrent LLM calls
+    batch_max_queries: int = 10_000
+    batch_llm_concurrency: int = 16
+
+    # GET /api/sessions/{id}/messages keyset pages: default and maximum page size
+    messages_page_size: int = 100
+    messages_page_max: int = 500
+
+    # Chat persistence: queue session/message writes and commit them in batches from one writer thread
+    message_write_behind: bool = True
+    message_write_max_batch: int = 256
+    message_write_max_wait_ms: float = 20.0
+
+    # Per-worker session history cache for prompt assembly: LRU over sessions, last N messages each
+    history_cache_enabled: bool = True
+    history_cache_max_sessions: int = 10_000
+    history_cache_messages: int = 12
+    history_cache_ttl_seconds: float = 300.0
+
+    # Prompt token budget: fixed parts (policy, language prompt, query) first, then context gets
+    # prompt_context_share of the rest (plus what history leaves unused) and history the remainder.
+    # Counted with the tiktoken encoding when available, otherwise estimated; completions are clamped
+    # so prompt + max_tokens fits model_context_tokens.
+    prompt_budget_tokens: int = 6000
+    prompt_context_share: float = 0.6
+    prompt_min_block_tokens: int = 64
+    prompt_tokenizer: str = "o200k_base"
+    model_context_tokens: int = 131_072
+
+    # Retrieved chunks per chat turn, and query-focused snippets: chunks longer than snippet_min_chars are
+    # cut down to their best snippet_max_windows windows of snippet_window sentences (BM25-scored)
+    retrieval_k: int = 5
+    snippet_enabled: bool = True
+    snippet_window: int = 4
+    snippet_max_windows: int = 3
+    snippet_min_chars: int = 800
+
+    # PDF ingest: page ranges of this many pages are extracted in parallel across a process pool (0 workers = CPU count)
+    pdf_extract_workers: int = 0
+    pdf_pages_per_task: int = 64
+
+    # Startup: warm indexes in a background thread (health reports "warming" until done) or block startup
+    startup_warmup_background: bool = True
+
     # DB
     database_url: str = Field(default="sqlite:///./app_data/irfan.sqlite3")
 
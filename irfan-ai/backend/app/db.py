@@ -25,6 +25,10 @@ def init_engine_and_create_tables() -> None:
     _engine = create_engine(settings.database_url, echo=False, connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {})
     from . import models  # noqa: F401  # Ensure models are imported before create_all
     SQLModel.metadata.create_all(_engine)
+    # create_all skips existing tables; add indexes introduced after a database was first created
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(_engine, checkfirst=True)
     # SQLite performance/concurrency PRAGMAs
     if settings.database_url.startswith("sqlite"):
         @event.listens_for(_engine, "connect")
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional
+
+from .config import get_settings
+
+
+@dataclass
+class _History:
+    messages: Deque[Dict[str, str]]
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+class SessionHistoryCache:
+    """Per-worker LRU over sessions, each holding a ring buffer of its last ``max_messages`` messages.
+
+    A session enters the cache when its history is loaded from the database (or when it is created
+    here, known to be empty); afterwards writes through ``append`` keep it current, so later turns
+    skip the database. Entries expire after ``ttl_seconds`` to bound staleness when several workers
+    serve the same session.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, max_messages: int = 12, ttl_seconds: float = 300.0) -> None:
+        self.max_sessions = max(1, int(max_sessions))
+        self.max_messages = max(1, int(max_messages))
+        self.ttl = float(ttl_seconds)
+        self._entries: "OrderedDict[str, _History]" = OrderedDict()
+        # Sessions whose history is being read from the database -> written to meanwhile
+        self._loading: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str, limit: int) -> Optional[List[Dict[str, str]]]:
+        if limit > self.max_messages:
+            return None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and self.ttl > 0 and time.monotonic() - entry.loaded_at > self.ttl:
+                del self._entries[session_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return [dict(m) for m in list(entry.messages)[-limit:]] if limit > 0 else []
+
+    def begin_load(self, session_id: str) -> None:
+        with self._lock:
+            self._loading[session_id] = False
+
+    def fill(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        """Store a history read from the database, unless the session was written while it was being read."""
+        with self._lock:
+            if self._loading.pop(session_id, True):
+                return
+            self._put(session_id, messages)
+
+    def seed_empty(self, session_id: str) -> None:
+        with self._lock:
+            self._put(session_id, [])
+
+    def _put(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        self._entries[session_id] = _History(messages=deque((dict(m) for m in messages), maxlen=self.max_messages))
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry.messages.append({"role": role, "content": content})
+            elif session_id in self._loading:
+                self._loading[session_id] = True
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+            if session_id in self._loading:
+                self._loading[session_id] = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_history_cache() -> Optional[SessionHistoryCache]:
+    settings = get_settings()
+    if not settings.history_cache_enabled:
+        return None
+    return SessionHistoryCache(
+        max_sessions=settings.history_cache_max_sessions,
+        max_messages=settings.history_cache_messages,
+        ttl_seconds=settings.history_cache_ttl_seconds,
+    )
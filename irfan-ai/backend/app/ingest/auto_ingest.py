@@ -3,17 +3,15 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
-import fitz  # PyMuPDF
-
-from ..retrieval.retriever import build_global_retriever, get_retriever
-from ..rag.vector_store import FaissVectorStore
+from .pdf_extract import extract_pdfs
+from ..retrieval.retriever import DATA_DIR, build_global_retriever
+from ..rag.vector_store import get_vector_store
 
 STATE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app_data', 'ingest_state.json'))
 UPLOADS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads', 'pdf'))
-DATA_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
-INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app_data', 'faiss'))
+DATA_ROOT = DATA_DIR
 
 
 def _load_state() -> Dict[str, float]:
@@ -27,17 +25,12 @@ def _load_state() -> Dict[str, float]:
 
 
 def _save_state(state: Dict[str, float]) -> None:
+    # Saved after every converted PDF; the temporary file keeps an interrupted write from losing the rest
     os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
-    with open(STATE_PATH, 'w', encoding='utf-8') as f:
+    tmp = STATE_PATH + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
         json.dump(state, f, ensure_ascii=False, indent=2)
-
-
-def _pdf_to_txt(pdf_path: str) -> str:
-    texts = []
-    with fitz.open(pdf_path) as doc:
-        for page in doc:
-            texts.append(page.get_text('text'))
-    return '\n\n'.join(t for t in texts if t)
+    os.replace(tmp, STATE_PATH)
 
 
 def _target_txt_path(pdf_path: str, category: str) -> str:
@@ -47,12 +40,19 @@ def _target_txt_path(pdf_path: str, category: str) -> str:
     return os.path.join(dest_dir, fname)
 
 
-def auto_ingest_new_uploads(uploads_root: str | None = None) -> Tuple[int, int]:
+def convert_new_uploads(uploads_root: str | None = None) -> Tuple[int, int]:
+    """Convert new/changed upload PDFs to .txt under the data root; indexes are not touched.
+
+    A PDF that fails to extract is reported and retried on the next run; the others still convert.
+    Returns (scanned, converted).
+    """
     uploads_root = os.path.abspath(uploads_root or UPLOADS_ROOT)
     os.makedirs(uploads_root, exist_ok=True)
     state = _load_state()
     converted = 0
     scanned = 0
+    # (pdf path, target .txt, state key, mtime) of new/changed PDFs, extracted together below
+    pending: List[Tuple[str, str, str, float]] = []
 
     for root, _dirs, files in os.walk(uploads_root):
         # category is top-level folder under uploads_root
@@ -70,18 +70,30 @@ def auto_ingest_new_uploads(uploads_root: str | None = None) -> Tuple[int, int]:
             key = os.path.relpath(fpath, uploads_root)
             if state.get(key) and state[key] >= mtime:
                 continue
-            # convert
-            txt = _pdf_to_txt(fpath)
-            out_txt = _target_txt_path(fpath, category=category)
-            with open(out_txt, 'w', encoding='utf-8') as f:
-                f.write(txt)
-            state[key] = mtime
-            converted += 1
+            pending.append((fpath, _target_txt_path(fpath, category=category), key, mtime))
+
+    # convert: PDFs and page ranges of large PDFs run in parallel, each .txt is written as its PDF finishes
+    by_pdf = {fpath: (key, mtime) for fpath, _txt, key, mtime in pending}
+    for result in extract_pdfs([(fpath, txt) for fpath, txt, _key, _mtime in pending]):
+        key, mtime = by_pdf[result.pdf_path]
+        if not result.ok:
+            print(f"⚠️ {key}: extraction failed, skipped ({result.error})")
+            continue
+        state[key] = mtime
+        # persisted per PDF: an interrupted run does not extract the finished ones again
+        _save_state(state)
+        converted += 1
+        print(
+            f"📄 {key}: {result.pages} pages, {result.chars} chars in {result.seconds:.1f}s "
+            f"({result.pages_per_second:.1f} pages/s)"
+        )
+
+    return scanned, converted
 
+
+def auto_ingest_new_uploads(uploads_root: str | None = None) -> Tuple[int, int]:
+    scanned, converted = convert_new_uploads(uploads_root)
     if converted > 0:
-        # rebuild indexes
-        build_global_retriever()
-        vs = FaissVectorStore(index_dir=INDEX_DIR)
-        vs.build_from_retriever(get_retriever())
-        _save_state(state)
+        # rebuild indexes (only the converted files are re-tokenized / re-embedded)
+        get_vector_store().sync_with_retriever(build_global_retriever())
     return scanned, converted
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+from ..config import get_settings
+
+# Page texts are joined with a blank line, empty pages skipped
+PAGE_SEPARATOR = '\n\n'
+
+
+@dataclass
+class ExtractResult:
+    pdf_path: str
+    txt_path: str
+    pages: int
+    chars: int
+    seconds: float
+    # Set when the PDF could not be extracted; txt_path is then left untouched
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, object]:
+        out: Dict[str, object] = {
+            'pdf': self.pdf_path,
+            'txt': self.txt_path,
+            'pages': self.pages,
+            'chars': self.chars,
+            'seconds': round(self.seconds, 3),
+            'pages_per_second': round(self.pages_per_second, 1),
+        }
+        if self.error is not None:
+            out['error'] = self.error
+        return out
+
+
+def _extract_range(pdf_path: str, start: int, stop: int, part_path: str) -> int:
+    """Write the text of pages [start, stop) to ``part_path``, page by page; returns characters written."""
+    chars = 0
+    with fitz.open(pdf_path) as doc, open(part_path, 'w', encoding='utf-8') as out:
+        for i in range(start, min(stop, doc.page_count)):
+            txt = doc[i].get_text('text')
+            if not txt:
+                continue
+            if chars:
+                out.write(PAGE_SEPARATOR)
+                chars += len(PAGE_SEPARATOR)
+            out.write(txt)
+            chars += len(txt)
+    return chars
+
+
+def _page_count(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+@dataclass
+class _Job:
+    pdf_path: str
+    txt_path: str
+    pages: int
+    parts: List[str]
+    chars: List[int]
+    pending: int
+    started: float
+    error: Optional[str] = None
+
+
+def _failed(pdf_path: str, txt_path: str, pages: int, started: float, error: BaseException) -> ExtractResult:
+    return ExtractResult(pdf_path, txt_path, pages, 0, time.perf_counter() - started, error=f'{type(error).__name__}: {error}')
+
+
+def _assemble(job: _Job) -> ExtractResult:
+    # Parts are streamed into a temporary file next to the target, which then replaces it atomically
+    tmp_path = job.txt_path + '.tmp'
+    chars = 0
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            for part, n in zip(job.parts, job.chars):
+                if not n:
+                    continue
+                if chars:
+                    out.write(PAGE_SEPARATOR)
+                    chars += len(PAGE_SEPARATOR)
+                with open(part, 'r', encoding='utf-8') as f:
+                    shutil.copyfileobj(f, out)
+                chars += n
+        os.replace(tmp_path, job.txt_path)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return _failed(job.pdf_path, job.txt_path, job.pages, job.started, e)
+    return ExtractResult(job.pdf_path, job.txt_path, job.pages, chars, time.perf_counter() - job.started)
+
+
+def _finish(job: _Job) -> ExtractResult:
+    if job.error is not None:
+        return ExtractResult(job.pdf_path, job.txt_path, job.pages, 0, time.perf_counter() - job.started, error=job.error)
+    return _assemble(job)
+
+
+def extract_pdfs(
+    files: Sequence[Tuple[str, str]],
+    max_workers: Optional[int] = None,
+    pages_per_task: Optional[int] = None,
+) -> Iterator[ExtractResult]:
+    """Extract the text of each ``(pdf_path, txt_path)`` pair into ``txt_path``.
+
+    PDFs are split into ranges of ``pages_per_task`` pages that run across a process pool; every
+    range writes its pages to a part file as it goes, and a PDF's parts are concatenated into the
+    target as soon as all of them are done, so no book is held in memory. Results are yielded in
+    completion order. A single range (or ``max_workers == 1``) runs inline without a pool.
+
+    A PDF that cannot be opened or extracted yields a result with ``error`` set (its target is not
+    written); the other PDFs are not affected.
+    """
+    settings = get_settings()
+    per_task = max(1, int(pages_per_task or settings.pdf_pages_per_task))
+    workers = int(max_workers if max_workers is not None else settings.pdf_extract_workers) or (os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory(prefix='irfan_pdf_') as tmp_dir:
+        jobs: List[_Job] = []
+        tasks: List[Tuple[_Job, int, int, int]] = []
+        failed: List[ExtractResult] = []
+        for n, (pdf_path, txt_path) in enumerate(files):
+            started = time.perf_counter()
+            try:
+                pages = _page_count(pdf_path)
+            except Exception as e:  # noqa: BLE001 - PyMuPDF raises its own error types for broken files
+                failed.append(_failed(pdf_path, txt_path, 0, started, e))
+                continue
+            starts = list(range(0, pages, per_task)) or [0]
+            job = _Job(pdf_path, txt_path, pages, [], [0] * len(starts), len(starts), time.perf_counter())
+            for idx, start in enumerate(starts):
+                job.parts.append(os.path.join(tmp_dir, f'{n}-{idx}.part'))
+                tasks.append((job, idx, start, start + per_task))
+            jobs.append(job)
+        yield from failed
+
+        if workers <= 1 or len(tasks) <= 1:
+            for job in jobs:
+                job.started = time.perf_counter()
+                try:
+                    for idx, part in enumerate(job.parts):
+                        job.chars[idx] = _extract_range(job.pdf_path, idx * per_task, (idx + 1) * per_task, part)
+                except Exception as e:  # noqa: BLE001
+                    yield _failed(job.pdf_path, job.txt_path, job.pages, job.started, e)
+                    continue
+                yield _assemble(job)
+            return
+
+        # spawn: the server process runs threads (warm-up, FAISS/torch pools) that must not be forked
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=ctx) as pool:
+            futures: Dict[Future, Tuple[_Job, int]] = {}
+            for job, idx, start, stop in tasks:
+                futures[pool.submit(_extract_range, job.pdf_path, start, stop, job.parts[idx])] = (job, idx)
+            pending = set(futures)
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        job, idx = futures[fut]
+                        try:
+                            job.chars[idx] = fut.result()
+                        except Exception as e:  # noqa: BLE001
+                            # The PDF fails as a whole once its other ranges are done; other PDFs go on
+                            if job.error is None:
+                                job.error = f'{type(e).__name__}: {e}'
+                        job.pending -= 1
+                        if job.pending == 0:
+                            yield _finish(job)
+            finally:
+                for fut in pending:
+                    fut.cancel()
+
+
+def extract_pdf(pdf_path: str, txt_path: str) -> ExtractResult:
+    """Extract one PDF into ``txt_path`` (page ranges of large PDFs still run in parallel).
+
+    Failures are reported through ``ExtractResult.error`` rather than raised.
+    """
+    return list(extract_pdfs([(pdf_path, txt_path)]))[0]
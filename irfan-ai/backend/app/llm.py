@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from .config import get_settings
+
+# One client per process: its pooled keep-alive connections to the HF router are reused by every request
+_CLIENT: Optional[AsyncOpenAI] = None
+
+
+def get_llm_client() -> AsyncOpenAI:
+    global _CLIENT
+    if _CLIENT is None:
+        settings = get_settings()
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry,
+            ),
+            # Generous read timeout: a streamed answer may pause between tokens, but connecting should be quick
+            timeout=httpx.Timeout(settings.llm_timeout, connect=settings.llm_connect_timeout),
+        )
+        _CLIENT = AsyncOpenAI(
+            base_url=settings.hf_api_base,
+            api_key=settings.hf_token,
+            http_client=http_client,
+            max_retries=settings.llm_max_retries,
+        )
+    return _CLIENT
+
+
+async def close_llm_client() -> None:
+    global _CLIENT
+    client, _CLIENT = _CLIENT, None
+    if client is not None:
+        await client.close()
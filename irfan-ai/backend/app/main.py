@@ -1,19 +1,24 @@
 
 from __future__ import annotations
 
-import os
 from datetime import datetime
 from typing import Any
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 from .config import get_settings
 from .db import init_engine_and_create_tables
-from .retrieval.retriever import build_global_retriever
-from .rag.vector_store import FaissVectorStore
-from .ingest.auto_ingest import auto_ingest_new_uploads
+from .history_cache import get_history_cache
+from .llm import close_llm_client
+from .message_store import close_message_writer, get_message_writer
+from .rag.answer_cache import get_answer_cache
+from .rag.embeddings import get_embedding_cache, get_query_embedder
+from .retrieval.result_cache import get_retrieval_cache
+from .startup import get_startup_state, start_warm_up
 from .routers.chat import router as chat_router
 from .routers.sessions import router as sessions_router
 from .routers.ingest import router as ingest_router
@@ -39,32 +44,52 @@ app.add_middleware(
 def on_startup() -> None:
     try:
         init_engine_and_create_tables()
-        # Build retriever at startup so we avoid cold-start delay on first request
-        data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
-        build_global_retriever(data_dir=data_dir)
-        # Auto-ingest PDFs from uploads and rebuild indexes
-        auto_ingest_new_uploads()
-        # Build FAISS vector index
-        from .retrieval.retriever import get_retriever
-        vs = FaissVectorStore(index_dir=os.path.join(os.path.dirname(__file__), "..", "app_data", "faiss"))
-        vs.build_from_retriever(get_retriever())
-        print("✅ Startup completed successfully!")
     except Exception as e:
         print(f"⚠️ Startup error (continuing anyway): {e}")
         import traceback
         traceback.print_exc()
+    # Uploads -> retriever snapshot -> vector index, each built at most once and only where stale
+    start_warm_up(background=settings.startup_warmup_background)
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    # Drain the pooled LLM connections, then commit every queued chat message
+    await close_llm_client()
+    await run_in_threadpool(close_message_writer)
 
 
 @app.get("/api/health")
 def healthcheck() -> dict[str, Any]:
+    emb_cache = get_embedding_cache()
+    answer_cache = get_answer_cache()
+    retrieval_cache = get_retrieval_cache()
+    message_writer = get_message_writer()
+    history_cache = get_history_cache()
     return {
         "status": "ok",
+        "startup": get_startup_state().as_dict(),
         "time": datetime.utcnow().isoformat() + "Z",
         "model": settings.model,
         "hf_api_base": settings.hf_api_base,
+        "embedding_cache": emb_cache.stats() if emb_cache is not None else None,
+        "query_embedder": get_query_embedder().stats(),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "retrieval_cache": retrieval_cache.stats() if retrieval_cache is not None else None,
+        "message_writer": message_writer.stats() if message_writer is not None else None,
+        "history_cache": history_cache.stats() if history_cache is not None else None,
     }
 
 
+@app.get("/api/ready")
+def readiness() -> Any:
+    # Readiness probe for rolling restarts: 503 until the index warm-up has finished
+    state = get_startup_state()
+    if not state.ready:
+        return JSONResponse(status_code=503, content={"ready": False, "state": state.state})
+    return {"ready": True, "state": state.state}
+
+
 # Routers
 app.include_router(sessions_router, prefix="/api")
 app.include_router(chat_router, prefix="/api/irfan")
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlmodel import Session
+
+from .config import get_settings
+from .db import get_session
+from .history_cache import get_history_cache
+from .models import ChatSession, Message
+
+# Messages are ordered by (created_at, id) everywhere; both columns follow session_id in
+# ix_message_session_created_id, so every history read here is an index range scan with LIMIT.
+
+
+@dataclass
+class _Write:
+    seq: int
+    session_id: str
+    at: datetime
+    # role is None for a session row (create if missing), otherwise a message
+    role: Optional[str] = None
+    content: str = ""
+    user_id: Optional[str] = None
+    title: Optional[str] = None
+
+
+def _apply(db: Session, writes: List[_Write]) -> None:
+    created: Dict[str, _Write] = {}
+    touched: Dict[str, datetime] = {}
+    for w in writes:
+        if w.role is None:
+            created.setdefault(w.session_id, w)
+        else:
+            touched[w.session_id] = w.at
+    for sid, w in created.items():
+        if db.get(ChatSession, sid) is None:
+            db.add(ChatSession(id=sid, user_id=w.user_id, title=w.title, created_at=w.at, updated_at=w.at))
+    db.flush()
+    db.add_all([Message(session_id=w.session_id, role=w.role, content=w.content, created_at=w.at) for w in writes if w.role is not None])
+    # One updated_at bump per session and batch instead of one per message
+    for sid, at in touched.items():
+        db.query(ChatSession).filter(ChatSession.id == sid).update({ChatSession.updated_at: at}, synchronize_session=False)
+
+
+class MessageWriter:
+    """Write-behind persistence for chat sessions and messages.
+
+    Writes are queued with their timestamp and committed by a single writer thread in batched
+    transactions (up to ``max_batch`` writes, collected for at most ``max_wait_ms``), so the request
+    thread never waits for the SQLite write lock. The queue is FIFO and there is one writer, so
+    rows land in enqueue order. Readers call ``flush_session`` first to see their own writes.
+    """
+
+    def __init__(self, max_batch: int = 256, max_wait_ms: float = 20.0) -> None:
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._cond = threading.Condition()
+        self._enqueued = 0
+        self._committed = 0
+        # session id -> seq of its latest queued write, dropped once committed
+        self._pending: Dict[str, int] = {}
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.writes = 0
+        self.failures = 0
+
+    def _enqueue(self, session_id: str, **fields: Any) -> bool:
+        # False once the writer is closed: nothing would commit the write, the caller writes it itself
+        with self._cond:
+            if self._closed:
+                return False
+            self._enqueued += 1
+            seq = self._enqueued
+            self._pending[session_id] = seq
+            # Timestamp taken under the lock: created_at order matches queue order
+            self._queue.put(_Write(seq=seq, session_id=session_id, at=datetime.utcnow(), **fields))
+            return True
+
+    def add_message(self, session_id: str, role: str, content: str) -> bool:
+        """Queue a message; returns False (nothing queued) when the writer is already closed."""
+        return self._enqueue(session_id, role=role, content=content)
+
+    def ensure_session(self, session_id: str, user_id: Optional[str] = None, title: Optional[str] = None) -> bool:
+        return self._enqueue(session_id, user_id=user_id, title=title)
+
+    def _wait_for(self, seq: int, timeout: Optional[float]) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._committed >= seq, timeout=timeout)
+
+    def flush_session(self, session_id: str, timeout: Optional[float] = None) -> bool:
+        """Block until every write queued so far for ``session_id`` is committed."""
+        with self._cond:
+            seq = self._pending.get(session_id)
+        return True if seq is None else self._wait_for(seq, timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            seq = self._enqueued
+        return self._wait_for(seq, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Stop accepting writes, commit everything queued and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _commit(self, batch: List[_Write]) -> None:
+        try:
+            with get_session() as db:
+                _apply(db, batch)
+                db.commit()
+            return
+        except Exception:  # noqa: BLE001
+            traceback.print_exc()
+        # Retry one write per transaction so a single bad row does not lose the whole batch
+        for w in batch:
+            try:
+                with get_session() as db:
+                    _apply(db, [w])
+                    db.commit()
+            except Exception as e:  # noqa: BLE001
+                self.failures += 1
+                print(f"⚠️ Message write failed ({w.session_id}): {e}")
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            self.batches += 1
+            self.writes += len(batch)
+            with self._cond:
+                self._committed = batch[-1].seq
+                for sid in [sid for sid, seq in self._pending.items() if seq <= self._committed]:
+                    del self._pending[sid]
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._enqueued - self._committed,
+            "batches": self.batches,
+            "writes": self.writes,
+            "failures": self.failures,
+        }
+
+
+# Process-wide writer, owned by the app lifecycle (closed and flushed in main.on_shutdown)
+_WRITER: Optional[MessageWriter] = None
+_WRITER_LOCK = threading.Lock()
+# Set by close_message_writer: writes arriving after shutdown (e.g. from a stream still in flight)
+# are synchronous instead of going to a new writer thread that nothing would flush
+_CLOSED = False
+
+
+def get_message_writer() -> Optional[MessageWriter]:
+    """The shared writer, or None when MESSAGE_WRITE_BEHIND is off or the writer was closed
+    (writes are then synchronous)."""
+    global _WRITER
+    settings = get_settings()
+    if not settings.message_write_behind or _CLOSED:
+        return None
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None and not _CLOSED:
+                _WRITER = MessageWriter(max_batch=settings.message_write_max_batch, max_wait_ms=settings.message_write_max_wait_ms)
+    return _WRITER
+
+
+def close_message_writer() -> None:
+    global _WRITER, _CLOSED
+    with _WRITER_LOCK:
+        writer, _WRITER = _WRITER, None
+        _CLOSED = True
+    if writer is not None:
+        writer.close()
+
+
+def _write_now(session_id: str, **fields: Any) -> None:
+    with get_session() as db:
+        _apply(db, [_Write(seq=0, session_id=session_id, at=datetime.utcnow(), **fields)])
+        db.commit()
+
+
+def save_message(session_id: str, role: str, content: str) -> None:
+    cache = get_history_cache()
+    if cache is not None:
+        cache.append(session_id, role, content)
+    writer = get_message_writer()
+    # A writer closed after it was fetched rejects the write; it is then committed right here
+    if writer is None or not writer.add_message(session_id, role, content):
+        _write_now(session_id, role=role, content=content)
+
+
+def ensure_session(session_id: str, user_id: Optional[str] = None, title: Optional[str] = None, new: bool = False) -> None:
+    """Create the session row if it does not exist yet (queued like messages).
+
+    ``new`` marks a freshly generated id: its history is known to be empty and is cached as such.
+    """
+    cache = get_history_cache()
+    if new and cache is not None:
+        cache.seed_empty(session_id)
+    writer = get_message_writer()
+    if writer is None or not writer.ensure_session(session_id, user_id=user_id, title=title):
+        _write_now(session_id, user_id=user_id, title=title)
+
+
+def flush_session(session_id: str) -> None:
+    # Read-your-writes: history/session reads call this before querying
+    writer = _WRITER
+    if writer is not None:
+        writer.flush_session(session_id)
+
+
+def invalidate_history(session_id: str) -> None:
+    # Called when a session's messages are deleted outside save_message (delete/reset)
+    cache = get_history_cache()
+    if cache is not None:
+        cache.invalidate(session_id)
+
+
+def flush_all() -> None:
+    writer = _WRITER
+    if writer is not None:
+        writer.flush()
+
+
+def load_recent_messages(session_id: str, limit: int = 12) -> List[Dict[str, str]]:
+    """The last ``limit`` messages of a session, oldest first.
+
+    Served from the per-worker history cache when the session is in it; otherwise read directly with
+    ORDER BY ... DESC LIMIT (a full ring buffer's worth, which then populates the cache).
+    """
+    if limit <= 0:
+        return []
+    cache = get_history_cache()
+    fetch = limit
+    if cache is not None:
+        cached = cache.get(session_id, limit)
+        if cached is not None:
+            return cached
+        cache.begin_load(session_id)
+        fetch = max(limit, cache.max_messages)
+    flush_session(session_id)
+    with get_session() as db:
+        rows = (
+            db.query(Message.role, Message.content)
+            .filter(Message.session_id == session_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(fetch)
+            .all()
+        )
+    messages = [{"role": role, "content": content} for role, content in reversed(rows)]
+    if cache is not None:
+        cache.fill(session_id, messages)
+    return messages[-limit:]
+
+
+def _cursor_key(db: Session, session_id: str, message_id: int) -> Optional[Tuple[datetime, int]]:
+    row = (
+        db.query(Message.created_at, Message.id)
+        .filter(Message.session_id == session_id, Message.id == message_id)
+        .first()
+    )
+    return (row[0], row[1]) if row is not None else None
+
+
+def list_messages(
+    session_id: str, limit: Optional[int], before: Optional[int] = None, after: Optional[int] = None
+) -> Tuple[List[Message], bool]:
+    """One keyset page of a session's messages, oldest first, plus whether more exist in that direction.
+
+    ``before``/``after`` are message ids from a previous page: ``before`` pages towards older messages
+    (the default, starting from the newest), ``after`` towards newer ones. ``limit=None`` returns every
+    message. Raises ``KeyError`` when the cursor message does not belong to the session.
+    """
+    flush_session(session_id)
+    with get_session() as db:
+        query = db.query(Message).filter(Message.session_id == session_id)
+        cursor_id = after if after is not None else before
+        if cursor_id is not None:
+            key = _cursor_key(db, session_id, cursor_id)
+            if key is None:
+                raise KeyError(cursor_id)
+            created_at, mid = key
+            if after is not None:
+                query = query.filter(or_(Message.created_at > created_at, and_(Message.created_at == created_at, Message.id > mid)))
+            else:
+                query = query.filter(or_(Message.created_at < created_at, and_(Message.created_at == created_at, Message.id < mid)))
+        if limit is None:
+            return query.order_by(Message.created_at.asc(), Message.id.asc()).all(), False
+        if after is not None:
+            rows = query.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit + 1).all()
+            return rows[:limit], len(rows) > limit
+        rows = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+        return list(reversed(rows[:limit])), len(rows) > limit
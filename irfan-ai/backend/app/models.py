@@ -3,6 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -15,8 +16,12 @@ class ChatSession(SQLModel, table=True):
 
 
 class Message(SQLModel, table=True):
+    # History reads filter by session and order by (created_at, id): the composite index serves both
+    # the last-N query and keyset pages without a sort, and replaces the single-column session_id index
+    __table_args__ = (Index("ix_message_session_created_id", "session_id", "created_at", "id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    session_id: str = Field(index=True, foreign_key="chatsession.id")
+    session_id: str = Field(foreign_key="chatsession.id")
     role: str = Field(index=True)  # "user" | "assistant" | "system"
     content: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
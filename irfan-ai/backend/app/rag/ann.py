@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import faiss  # type: ignore
+import numpy as np
+
+INDEX_KINDS = ('flat', 'ivf', 'hnsw')
+QUANTIZATIONS = ('none', 'fp16', 'sq8', 'pq')
+
+# FAISS warns below ~39 training points per centroid; we also never train on more than this many per centroid
+_IVF_MIN_POINTS_PER_LIST = 39
+_IVF_MAX_POINTS_PER_LIST = 256
+_MAX_TRAIN_POINTS = 65_536
+# PQ codebooks have 256 centroids per sub-quantizer and need ~39 points each to train well
+_PQ_MIN_TRAIN_POINTS = 39 * 256
+# Filtered HNSW searches whose partition holds less than this fraction of the index scan the
+# partition exactly instead: the graph walk would mostly visit filtered-out nodes and come back short
+HNSW_EXACT_FILTER_RATIO = 0.1
+
+
+@dataclass(frozen=True)
+class AnnConfig:
+    kind: str = 'flat'
+    min_size: int = 20_000
+    ivf_nlist: int = 0  # 0 -> 4 * sqrt(n)
+    ivf_nprobe: int = 16
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 80
+    hnsw_ef_search: int = 64
+    quantization: str = 'none'  # none (float32) | fp16 | sq8 (int8 scalar) | pq (product quantizer)
+    pq_m: int = 48
+    rescore: bool = True
+    rescore_factor: int = 4
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> 'AnnConfig':
+        return cls(
+            kind=settings.vector_index_type,
+            min_size=settings.vector_index_min_size,
+            ivf_nlist=settings.vector_ivf_nlist,
+            ivf_nprobe=settings.vector_ivf_nprobe,
+            hnsw_m=settings.vector_hnsw_m,
+            hnsw_ef_construction=settings.vector_hnsw_ef_construction,
+            hnsw_ef_search=settings.vector_hnsw_ef_search,
+            quantization=settings.vector_quantization,
+            pq_m=settings.vector_pq_m,
+            rescore=settings.vector_rescore,
+            rescore_factor=settings.vector_rescore_factor,
+        )
+
+
+def nlist_for(cfg: AnnConfig, n: int) -> int:
+    nlist = cfg.ivf_nlist or int(4 * math.sqrt(max(n, 1)))
+    return max(1, min(nlist, n // _IVF_MIN_POINTS_PER_LIST))
+
+
+def resolve_kind(cfg: AnnConfig, n: int) -> str:
+    """Index kind actually used for ``n`` vectors: small corpora always fall back to exact flat search."""
+    kind = cfg.kind if cfg.kind in INDEX_KINDS else 'flat'
+    if kind != 'flat' and n < cfg.min_size:
+        return 'flat'
+    if kind == 'ivf' and n < _IVF_MIN_POINTS_PER_LIST:
+        return 'flat'
+    return kind
+
+
+def resolve_quantization(cfg: AnnConfig, n: int) -> str:
+    """Vector encoding actually used for ``n`` vectors: PQ needs enough points to train its codebooks."""
+    quant = cfg.quantization if cfg.quantization in QUANTIZATIONS else 'none'
+    if quant == 'pq' and n < _PQ_MIN_TRAIN_POINTS:
+        return 'sq8'
+    return quant
+
+
+def _pq_m(cfg: AnnConfig, dim: int) -> int:
+    # Sub-quantizer count must divide the dimension; take the closest divisor not above the setting
+    m = max(1, min(cfg.pq_m, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def _codec(quant: str, cfg: AnnConfig, dim: int) -> str:
+    if quant == 'fp16':
+        return 'SQfp16'
+    if quant == 'sq8':
+        return 'SQ8'
+    if quant == 'pq':
+        return f'PQ{_pq_m(cfg, dim)}'
+    return 'Flat'
+
+
+def index_description(kind: str, quant: str, cfg: AnnConfig, n: int, dim: int) -> str:
+    codec = _codec(quant, cfg, dim)
+    if kind == 'ivf':
+        return f'IVF{nlist_for(cfg, n)},{codec}'
+    if kind == 'hnsw':
+        return f'IDMap2,HNSW{cfg.hnsw_m}' + (f'_{codec}' if codec != 'Flat' else '')
+    if quant == 'pq':
+        # IndexPQ rejects search parameters (id selectors); a single-list IVF behaves like flat PQ
+        return f'IVF1,{codec}'
+    return f'IDMap2,{codec}'
+
+
+def supports_remove(kind: str) -> bool:
+    # HNSW graphs cannot drop nodes; removals there are handled by rebuilding
+    return kind != 'hnsw'
+
+
+def build_index(kind: str, cfg: AnnConfig, vectors: np.ndarray, ids: np.ndarray, quant: str = 'none') -> faiss.Index:
+    n, dim = vectors.shape
+    index = faiss.index_factory(dim, index_description(kind, quant, cfg, n, dim), faiss.METRIC_INNER_PRODUCT)
+    if kind == 'hnsw':
+        faiss.downcast_index(index.index).hnsw.efConstruction = cfg.hnsw_ef_construction
+    if not index.is_trained:
+        max_train = max(_MAX_TRAIN_POINTS, nlist_for(cfg, n) * _IVF_MAX_POINTS_PER_LIST if kind == 'ivf' else 0)
+        train = vectors
+        if n > max_train:
+            rng = np.random.default_rng(1234)
+            train = vectors[np.sort(rng.choice(n, size=max_train, replace=False))]
+        index.train(np.ascontiguousarray(train, dtype='float32'))
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype='float32'), np.asarray(ids, dtype='int64'))
+    return index
+
+
+def search_params(kind: str, cfg: AnnConfig, sel: Optional[Any] = None, quant: str = 'none', selectivity: float = 1.0) -> Optional[Any]:
+    """Per-search FAISS parameters (nprobe / efSearch and an optional id selector).
+
+    ``selectivity`` is the fraction of the index the selector lets through; HNSW widens its
+    candidate list by its inverse, since filtered-out nodes are still visited but never returned.
+    """
+    if kind == 'ivf' or (kind == 'flat' and quant == 'pq'):
+        nprobe = cfg.ivf_nprobe if kind == 'ivf' else 1
+        return faiss.SearchParametersIVF(sel=sel, nprobe=nprobe) if sel is not None else faiss.SearchParametersIVF(nprobe=nprobe)
+    if kind == 'hnsw':
+        if sel is None:
+            return faiss.SearchParametersHNSW(efSearch=cfg.hnsw_ef_search)
+        ef = int(math.ceil(cfg.hnsw_ef_search / min(1.0, max(selectivity, HNSW_EXACT_FILTER_RATIO))))
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=ef)
+    if sel is not None:
+        return faiss.SearchParameters(sel=sel)
+    return None
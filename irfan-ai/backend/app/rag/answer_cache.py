@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import get_settings
+
+# (normalized query, language, sorted categories, (max_tokens, temperature, top_p))
+AnswerKey = Tuple[str, str, Tuple[str, ...], Tuple[int, float, float]]
+
+_WORD = re.compile(r'\w+')
+
+
+def make_answer_key(
+    normalized_query: str,
+    language: str,
+    categories: Optional[Sequence[str]],
+    max_tokens: int,
+    temperature: float,
+    top_p: float,
+) -> AnswerKey:
+    # Whitespace and punctuation differences ("kaç ayet?" vs "kaç  ayet") map to the same key;
+    # answers generated with other sampling parameters or a different token limit do not
+    words = ' '.join(_WORD.findall(normalized_query))
+    cats = tuple(sorted(c.lower() for c in categories)) if categories else ()
+    return (words, language, cats, (int(max_tokens), float(temperature), float(top_p)))
+
+
+@dataclass
+class CachedAnswer:
+    content: str
+    citations: List[str]
+    created_at: float
+    embedding: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+class AnswerCache:
+    """Bounded LRU of generated answers with TTL, tied to one index generation.
+
+    Exact hits match the normalized query, language, categories and generation parameters. The
+    optional semantic tier compares the query embedding against cached answers with the same
+    language, categories and parameters and accepts the best one with cosine similarity
+    >= ``semantic_threshold``. Any change of the index generation empties the cache, since answers
+    depend on the retrieved context. Only completed answers should be stored: callers skip ``put``
+    for truncated (``finish_reason == "length"``) or interrupted generations.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600.0, semantic_threshold: Optional[float] = None) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.semantic_threshold = semantic_threshold
+        self._entries: "OrderedDict[AnswerKey, CachedAnswer]" = OrderedDict()
+        self._generation: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _sync_generation(self, generation: Hashable) -> None:
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+
+    def _expired(self, entry: CachedAnswer, now: float) -> bool:
+        return self.ttl > 0 and now - entry.created_at > self.ttl
+
+    def _semantic_lookup(self, key: AnswerKey, embedding: np.ndarray, now: float) -> Optional[CachedAnswer]:
+        candidates = [
+            (k, e) for k, e in self._entries.items()
+            if k[1:] == key[1:] and e.embedding is not None and not self._expired(e, now)
+        ]
+        if not candidates:
+            return None
+        sims = np.stack([e.embedding for _k, e in candidates]) @ embedding.reshape(-1)
+        best = int(np.argmax(sims))
+        if float(sims[best]) < float(self.semantic_threshold or 0.0):
+            return None
+        self._entries.move_to_end(candidates[best][0])
+        return candidates[best][1]
+
+    def _get_exact(self, key: AnswerKey, generation: Hashable, now: float) -> Optional[CachedAnswer]:
+        self._sync_generation(generation)
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry, now):
+            del self._entries[key]
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def get_exact(self, key: AnswerKey, generation: Hashable) -> Optional[CachedAnswer]:
+        """Exact-tier lookup only; a miss is not counted, so callers can follow up with ``get``.
+
+        Lets callers compute the query embedding for the semantic tier only when this misses.
+        """
+        with self._lock:
+            return self._get_exact(key, generation, time.monotonic())
+
+    def get(self, key: AnswerKey, generation: Hashable, embedding: Optional[np.ndarray] = None) -> Optional[CachedAnswer]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._get_exact(key, generation, now)
+            if entry is not None:
+                return entry
+            if embedding is not None and self.semantic_threshold is not None:
+                entry = self._semantic_lookup(key, embedding, now)
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def put(self, key: AnswerKey, generation: Hashable, content: str, citations: List[str], embedding: Optional[np.ndarray] = None) -> None:
+        vec = None
+        if embedding is not None:
+            vec = np.asarray(embedding, dtype='float32').reshape(-1).copy()
+        with self._lock:
+            if self._generation is not None and generation != self._generation:
+                # Generated against an index that has been replaced meanwhile
+                return
+            self._generation = generation
+            self._entries[key] = CachedAnswer(content=content, citations=list(citations), created_at=time.monotonic(), embedding=vec)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            'invalidations': self.invalidations,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_answer_cache() -> Optional[AnswerCache]:
+    settings = get_settings()
+    if not settings.answer_cache_enabled:
+        return None
+    return AnswerCache(
+        max_entries=settings.answer_cache_max_entries,
+        ttl_seconds=settings.answer_cache_ttl_seconds,
+        semantic_threshold=settings.answer_cache_semantic_threshold if settings.answer_cache_semantic else None,
+    )
@@ -0,0 +1,125 @@
+"""Recall/latency benchmark for the FAISS index modes used by FaissVectorStore.
+
+Builds every configured index type on a synthetic clustered corpus with the same
+``ann.build_index`` code path the store uses, and reports recall@k against exact flat
+search plus p50/p99 single-query latency and serialized index size. Quantized variants are
+re-scored with exact vectors unless ``--rescore-factor 0``.
+
+    python -m backend.app.rag.benchmark_ann --n 100000 --queries 500 --nprobe 8,16,32 --ef 32,64,128
+    python -m backend.app.rag.benchmark_ann --kinds flat,ivf --quant none,fp16,sq8,pq
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import replace
+from typing import List, Tuple
+
+import faiss  # type: ignore
+import numpy as np
+
+from .ann import AnnConfig, build_index, search_params
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, clusters: int, spread: float, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Clustered unit vectors resemble sentence embeddings far better than uniform noise;
+    # a larger spread blurs the clusters and makes approximate search harder
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype('float32')
+    xb = centers[rng.integers(0, clusters, size=n)] + spread * rng.standard_normal((n, dim)).astype('float32')
+    xq = centers[rng.integers(0, clusters, size=n_queries)] + spread * rng.standard_normal((n_queries, dim)).astype('float32')
+    faiss.normalize_L2(xb)
+    faiss.normalize_L2(xq)
+    return xb, xq
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / float(truth.shape[0] * k)
+
+
+def _bench(index: faiss.Index, params, xq: np.ndarray, k: int, exact: np.ndarray | None = None, factor: int = 1) -> Tuple[np.ndarray, float, float]:
+    # With ``exact`` given, fetch k * factor candidates and re-rank them by exact inner product,
+    # like FaissVectorStore does for quantized indexes
+    fetch = k * factor if exact is not None else k
+    found = np.full((xq.shape[0], k), -1, dtype='int64')
+    lat: List[float] = []
+    for i in range(xq.shape[0]):
+        q = xq[i:i + 1]
+        t0 = time.perf_counter()
+        _d, ids = index.search(q, fetch, params=params) if params is not None else index.search(q, fetch)
+        cand = ids[0]
+        if exact is not None:
+            cand = cand[cand >= 0]
+            cand = cand[np.argsort(-(exact[cand] @ q[0]), kind='stable')[:k]]
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        found[i, :len(cand)] = cand
+    return found, float(np.percentile(lat, 50)), float(np.percentile(lat, 99))
+
+
+def main(argv: List[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--n', type=int, default=50_000)
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--queries', type=int, default=300)
+    ap.add_argument('--k', type=int, default=5)
+    ap.add_argument('--clusters', type=int, default=256)
+    ap.add_argument('--spread', type=float, default=2.0)
+    ap.add_argument('--kinds', default='flat,ivf,hnsw')
+    ap.add_argument('--nlist', type=int, default=0)
+    ap.add_argument('--nprobe', default='8,16,32')
+    ap.add_argument('--hnsw-m', type=int, default=32)
+    ap.add_argument('--ef-construction', type=int, default=80)
+    ap.add_argument('--ef', default='32,64,128')
+    ap.add_argument('--quant', default='none', help='comma list of none,fp16,sq8,pq')
+    ap.add_argument('--pq-m', type=int, default=48)
+    ap.add_argument('--rescore-factor', type=int, default=4, help='exact re-scoring of k * factor candidates for quantized indexes (0 = off)')
+    ap.add_argument('--threads', type=int, default=1, help='FAISS OpenMP threads (1 = per-request latency)')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args(argv)
+
+    faiss.omp_set_num_threads(args.threads)
+    xb, xq = synthetic_corpus(args.n, args.dim, args.queries, args.clusters, args.spread, args.seed)
+    ids = np.arange(args.n, dtype='int64')
+    base = AnnConfig(min_size=0, ivf_nlist=args.nlist, hnsw_m=args.hnsw_m, hnsw_ef_construction=args.ef_construction, pq_m=args.pq_m)
+    quants = [q.strip() for q in args.quant.split(',') if q.strip()]
+
+    t0 = time.perf_counter()
+    flat = build_index('flat', base, xb, ids)
+    flat_build_s = time.perf_counter() - t0
+    _d, truth = flat.search(xq, args.k)
+
+    print(f'corpus n={args.n} dim={args.dim} queries={args.queries} k={args.k} threads={args.threads}')
+    print(f"{'index':<46}{'build s':>10}{'MB':>9}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for kind in [k.strip() for k in args.kinds.split(',') if k.strip()]:
+        if kind == 'ivf':
+            variants = [replace(base, kind=kind, ivf_nprobe=int(p)) for p in args.nprobe.split(',')]
+        elif kind == 'hnsw':
+            variants = [replace(base, kind=kind, hnsw_ef_search=int(e)) for e in args.ef.split(',')]
+        else:
+            variants = [replace(base, kind='flat')]
+        for quant in quants:
+            if kind == 'flat' and quant == 'none':
+                index, build_s = flat, flat_build_s
+            else:
+                t0 = time.perf_counter()
+                index = build_index(kind, variants[0], xb, ids, quant=quant)
+                build_s = time.perf_counter() - t0
+            size_mb = faiss.serialize_index(index).nbytes / 1e6
+            for cfg in variants:
+                rescore = quant != 'none' and args.rescore_factor > 0
+                found, p50, p99 = _bench(
+                    index, search_params(kind, cfg, quant=quant), xq, args.k,
+                    exact=xb if rescore else None, factor=args.rescore_factor,
+                )
+                label = kind
+                if kind == 'ivf':
+                    label = f'ivf nlist={faiss.extract_index_ivf(index).nlist} nprobe={cfg.ivf_nprobe}'
+                elif kind == 'hnsw':
+                    label = f'hnsw M={cfg.hnsw_m} ef={cfg.hnsw_ef_search}'
+                label += f' {quant}' + (f' rescore x{args.rescore_factor}' if rescore else '')
+                print(f'{label:<46}{build_s:>10.2f}{size_mb:>9.1f}{_recall(found, truth):>10.3f}{p50:>10.3f}{p99:>10.3f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app_data', 'emb_cache'))
+
+_KEY_BYTES = 16
+_MIN_CAPACITY = 1024
+_WS_RE = re.compile(r'\s+')
+_EPOCH_FILE_RE = re.compile(r'^(?:vectors|keys|last_used)-(\d+)\.(?:f32|bin|i64)$')
+
+
+def normalize_text(text: str) -> str:
+    return _WS_RE.sub(' ', text).strip()
+
+
+class EmbeddingCache:
+    """Content-addressed embedding store: one float32 memmap row per (model, normalized text) key.
+
+    Layout under ``cache_dir``: ``meta.json`` (model, dim and the current epoch) plus, per epoch,
+    ``vectors-<epoch>.f32`` (capacity x dim memmap), ``keys-<epoch>.bin`` (S16 digests in row order,
+    append-only; its length is the number of committed rows) and ``last_used-<epoch>.i64`` (LRU
+    timestamp per row, memmap). Worker processes may share the directory: writers hold an
+    exclusive ``fcntl`` lock on ``LOCK``, first pick up the keys other processes appended, and write
+    the vectors before the keys that commit them, so a key never points at another text's row.
+    When the number of entries exceeds ``max_entries`` the least recently used rows are copied into
+    the files of a new epoch, which ``meta.json`` then points at.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 500_000) -> None:
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.model_name = model_name
+        self.max_entries = max(1, int(max_entries))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._meta_path = os.path.join(self.cache_dir, 'meta.json')
+        self._lock_path = os.path.join(self.cache_dir, 'LOCK')
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._dim: Optional[int] = None
+        self._capacity = 0
+        self._count = 0
+        self._vectors: Optional[np.memmap] = None
+        self._last_used: Optional[np.memmap] = None
+        self._rows: Dict[bytes, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        with self._lock, self._file_lock():
+            self._sync()
+
+    # -- keys -----------------------------------------------------------------
+
+    def make_key(self, text: str) -> bytes:
+        h = hashlib.blake2b(digest_size=_KEY_BYTES)
+        h.update(self.model_name.encode('utf-8'))
+        h.update(b'\x00')
+        h.update(normalize_text(text).encode('utf-8', errors='ignore'))
+        return h.digest()
+
+    # -- persistence ----------------------------------------------------------
+
+    @contextmanager
+    def _file_lock(self, blocking: bool = True) -> Iterator[bool]:
+        # Serializes writers across processes; released when the file is closed. Yields whether the
+        # lock was taken (always, unless non-blocking and held elsewhere).
+        with open(self._lock_path, 'a') as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+
+    def _paths(self, epoch: int) -> Tuple[str, str, str]:
+        p = lambda name: os.path.join(self.cache_dir, f'{name}-{epoch}')  # noqa: E731
+        return p('vectors') + '.f32', p('keys') + '.bin', p('last_used') + '.i64'
+
+    def _reset(self) -> None:
+        self._dim = None
+        self._capacity = 0
+        self._count = 0
+        self._vectors = None
+        self._last_used = None
+        self._rows = {}
+
+    def _map(self) -> None:
+        # (Re)map at the current file size; mappings other processes grew stay valid for the old size
+        assert self._dim is not None
+        vectors_path, _keys_path, used_path = self._paths(self._epoch)
+        capacity = os.path.getsize(vectors_path) // (self._dim * 4)
+        if capacity == self._capacity and self._vectors is not None:
+            return
+        self._vectors = np.memmap(vectors_path, dtype='float32', mode='r+', shape=(capacity, self._dim)) if capacity else None
+        self._last_used = np.memmap(used_path, dtype='int64', mode='r+', shape=(capacity,)) if capacity else None
+        self._capacity = capacity
+
+    def _sync(self) -> None:
+        # Caller holds the file lock: bring the in-memory index in line with what is on disk
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            epoch, dim = int(meta['epoch']), int(meta['dim'])
+        except Exception:
+            self._reset()
+            return
+        if meta.get('model') != self.model_name:
+            self._reset()
+            return
+        if epoch != self._epoch or dim != self._dim:
+            # Compacted (or created) by another process: its row numbers no longer match ours
+            self._reset()
+            self._epoch, self._dim = epoch, dim
+        try:
+            self._map()
+            _vectors_path, keys_path, _used_path = self._paths(self._epoch)
+            count = min(os.path.getsize(keys_path) // _KEY_BYTES, self._capacity)
+            if count > self._count:
+                # Only the keys appended since the last sync are read
+                with open(keys_path, 'rb') as f:
+                    f.seek(self._count * _KEY_BYTES)
+                    tail = f.read((count - self._count) * _KEY_BYTES)
+                for i in range(count - self._count):
+                    self._rows[tail[i * _KEY_BYTES:(i + 1) * _KEY_BYTES]] = self._count + i
+                self._count = count
+        except OSError:
+            self._reset()
+            self._epoch = 0
+
+    def _publish(self, epoch: int, dim: int) -> None:
+        # meta.json is replaced last, so a crash mid-compaction leaves the previous epoch intact
+        tmp_meta = self._meta_path + '.tmp'
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'dim': dim, 'epoch': epoch}, f)
+        os.replace(tmp_meta, self._meta_path)
+        current = {os.path.basename(p) for p in self._paths(epoch)}
+        for name in os.listdir(self.cache_dir):
+            if _EPOCH_FILE_RE.match(name) and name not in current:
+                os.remove(os.path.join(self.cache_dir, name))
+        self._sync()
+
+    def _create(self, dim: int) -> None:
+        # A fresh epoch number: files of an older one may still be mapped by other processes
+        epochs = [int(m.group(1)) for m in map(_EPOCH_FILE_RE.match, os.listdir(self.cache_dir)) if m]
+        epoch = max(epochs + [self._epoch]) + 1
+        for path in self._paths(epoch):
+            open(path, 'wb').close()
+        # Single-index layout of older versions (rewritten keys.npy / last_used.npy)
+        for legacy in ('vectors.f32', 'keys.npy', 'last_used.npy'):
+            legacy_path = os.path.join(self.cache_dir, legacy)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+        self._publish(epoch, dim)
+
+    def _reserve(self, extra: int) -> None:
+        assert self._dim is not None
+        needed = self._count + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(_MIN_CAPACITY, self._capacity)
+        while capacity < needed:
+            capacity *= 2
+        vectors_path, _keys_path, used_path = self._paths(self._epoch)
+        for path, row_bytes in ((vectors_path, self._dim * 4), (used_path, 8)):
+            with open(path, 'r+b') as f:
+                f.truncate(capacity * row_bytes)
+        self._map()
+
+    def _evict(self, incoming: int) -> None:
+        # Keep the most recently used entries so that, after the insert, we sit at ~90% of the bound
+        if not self._count or self._count + incoming <= self.max_entries:
+            return
+        assert self._last_used is not None
+        keep = max(0, min(self._count, int(self.max_entries * 0.9) - incoming))
+        order = np.argsort(self._last_used[:self._count], kind='stable')
+        survivors = np.sort(order[self._count - keep:]) if keep else np.zeros(0, dtype='int64')
+        self.evictions += self._count - keep
+        self._compact(survivors)
+
+    def _compact(self, survivors: np.ndarray) -> None:
+        assert self._dim is not None and self._vectors is not None and self._last_used is not None
+        dim, epoch = self._dim, self._epoch + 1
+        vectors_path, keys_path, used_path = self._paths(epoch)
+        capacity = max(_MIN_CAPACITY, int(len(survivors) * 1.25))
+        fresh = np.memmap(vectors_path, dtype='float32', mode='w+', shape=(capacity, dim))
+        step = 8192
+        for start in range(0, len(survivors), step):
+            sel = survivors[start:start + step]
+            fresh[start:start + len(sel)] = self._vectors[sel]
+        fresh.flush()
+        del fresh
+        used = np.memmap(used_path, dtype='int64', mode='w+', shape=(capacity,))
+        used[:len(survivors)] = self._last_used[survivors]
+        used.flush()
+        del used
+        keys = np.fromfile(self._paths(self._epoch)[1], dtype=f'S{_KEY_BYTES}', count=self._count)
+        keys[survivors].tofile(keys_path)
+        self._publish(epoch, dim)
+
+    # -- public API -----------------------------------------------------------
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get_many(self, keys: Sequence[bytes]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """Return (vectors for the hits in input order, boolean hit mask)."""
+        with self._lock:
+            rows = np.fromiter((self._rows.get(k, -1) for k in keys), dtype='int64', count=len(keys))
+            if not bool((rows >= 0).all()):
+                # Misses may have been added by another process; not waited for while one is writing
+                with self._file_lock(blocking=False) as locked:
+                    if locked:
+                        self._sync()
+                        rows = np.fromiter((self._rows.get(k, -1) for k in keys), dtype='int64', count=len(keys))
+            hit = rows >= 0
+            n_hit = int(hit.sum())
+            self.hits += n_hit
+            self.misses += len(keys) - n_hit
+            if not n_hit or self._vectors is None or self._last_used is None:
+                return None, hit
+            hit_rows = rows[hit]
+            # Approximate LRU: written in place without the file lock
+            self._last_used[hit_rows] = time.time_ns()
+            first = int(hit_rows[0])
+            if int(hit_rows[-1]) - first + 1 == n_hit and (n_hit == 1 or bool(np.all(np.diff(hit_rows) == 1))):
+                # Rows stored in request order (typical for corpus rebuilds): hand out a view, no copy
+                view = np.asarray(self._vectors[first:first + n_hit])
+                view.flags.writeable = False
+                return view, hit
+            return np.asarray(self._vectors[hit_rows]), hit
+
+    def put_many(self, keys: Sequence[bytes], vectors: np.ndarray) -> None:
+        if not len(keys):
+            return
+        vectors = np.asarray(vectors, dtype='float32')
+        with self._lock, self._file_lock():
+            # Rows other processes committed meanwhile are known before ours are numbered
+            self._sync()
+            if self._dim is None:
+                self._create(int(vectors.shape[1]))
+            elif vectors.shape[1] != self._dim:
+                return
+            fresh: Dict[bytes, int] = {}
+            for i, k in enumerate(keys):
+                if k not in self._rows:
+                    fresh[k] = i
+            if not fresh:
+                return
+            self._evict(len(fresh))
+            self._reserve(len(fresh))
+            assert self._vectors is not None and self._last_used is not None
+            start = self._count
+            src = np.fromiter(fresh.values(), dtype='int64', count=len(fresh))
+            self._vectors[start:start + len(src)] = vectors[src]
+            self._last_used[start:start + len(src)] = time.time_ns()
+            self._vectors.flush()
+            # Appending the keys commits the rows; the key file is never rewritten outside compaction
+            with open(self._paths(self._epoch)[1], 'r+b') as f:
+                f.seek(start * _KEY_BYTES)
+                f.write(b''.join(fresh))
+                f.truncate()
+            for offset, k in enumerate(fresh):
+                self._rows[k] = start + offset
+            self._count = start + len(src)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': self._count,
+            'capacity': self._capacity,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def cache_dir_for_model(model_name: str, root: str | None = None) -> str:
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+    return os.path.join(root or CACHE_DIR, slug)
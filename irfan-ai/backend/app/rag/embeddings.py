@@ -1,13 +1,19 @@
-
 from __future__ import annotations
 
+import queue
 import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
 from functools import lru_cache
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from ..config import get_settings
+from .embedding_cache import EmbeddingCache, cache_dir_for_model, normalize_text
+
 _MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
 
 _model_lock = threading.Lock()
@@ -23,10 +29,197 @@ def _load_model() -> SentenceTransformer:
     return _model  # type: ignore[return-value]
 
 
-def embed_texts(texts: List[str], batch_size: int = 64) -> np.ndarray:
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    settings = get_settings()
+    if not settings.embedding_cache_enabled:
+        return None
+    return EmbeddingCache(cache_dir_for_model(_MODEL_NAME), _MODEL_NAME, max_entries=settings.embedding_cache_max_entries)
+
+
+def _encode(texts: List[str], batch_size: int) -> np.ndarray:
     model = _load_model()
     embs = model.encode(texts, batch_size=batch_size, show_progress_bar=False, normalize_embeddings=True)
     if not isinstance(embs, np.ndarray):
         embs = np.asarray(embs)
     return embs.astype('float32')
 
+
+def embed_texts(texts: List[str], batch_size: int = 64) -> np.ndarray:
+    cache = get_embedding_cache()
+    if cache is None or not texts:
+        return _encode(texts, batch_size)
+    keys = [cache.make_key(t) for t in texts]
+    cached, hit = cache.get_many(keys)
+    if cached is not None and bool(hit.all()):
+        return cached
+    # Encode each distinct missing text once
+    miss_pos = np.flatnonzero(~hit)
+    first_pos: dict[bytes, int] = {}
+    for p in miss_pos:
+        first_pos.setdefault(keys[p], int(p))
+    uniq_keys = list(first_pos)
+    fresh = _encode([texts[first_pos[k]] for k in uniq_keys], batch_size)
+    cache.put_many(uniq_keys, fresh)
+    out = np.empty((len(texts), fresh.shape[1]), dtype='float32')
+    if cached is not None:
+        out[hit] = cached
+    slot = {k: i for i, k in enumerate(uniq_keys)}
+    out[miss_pos] = fresh[[slot[keys[p]] for p in miss_pos]]
+    return out
+
+
+def cached_embeddings(texts: List[str]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """Float32 embeddings already in the embedding cache, without encoding misses.
+
+    Returns (vectors of the hits in input order, boolean hit mask).
+    """
+    cache = get_embedding_cache()
+    if cache is None or not texts:
+        return None, np.zeros(len(texts), dtype=bool)
+    return cache.get_many([cache.make_key(t) for t in texts])
+
+
+class QueryEmbedder:
+    """Coalesces concurrent single-query embeddings into one batched ``encode`` call.
+
+    Callers block on a future while a background worker drains the queue: it waits at most
+    ``max_wait_ms`` after the first pending query (or until ``max_batch`` queries are queued),
+    encodes the distinct queries together and resolves every waiter. Recently embedded
+    queries are answered from an LRU without touching the model.
+    """
+
+    def __init__(self, max_batch: int = 32, max_wait_ms: float = 5.0, lru_size: int = 4096) -> None:
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.lru_size = max(0, int(lru_size))
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lru_lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def _lru_get(self, key: str) -> Optional[np.ndarray]:
+        with self._lru_lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return vec
+
+    def _lru_put(self, key: str, vec: np.ndarray) -> None:
+        if not self.lru_size:
+            return
+        with self._lru_lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='query-embedder', daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: List[Tuple[str, Future]]) -> None:
+        waiters: Dict[str, List[Future]] = {}
+        for key, fut in batch:
+            waiters.setdefault(key, []).append(fut)
+        keys = list(waiters)
+        try:
+            embs = _encode(keys, batch_size=len(keys))
+        except Exception as e:  # noqa: BLE001
+            for futs in waiters.values():
+                for fut in futs:
+                    fut.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_queries += len(batch)
+        for key, vec in zip(keys, embs):
+            vec.setflags(write=False)
+            self._lru_put(key, vec)
+            for fut in waiters[key]:
+                fut.set_result(vec)
+
+    def embed(self, query: str) -> np.ndarray:
+        """Return the normalized embedding of ``query`` as a (1, dim) float32 array."""
+        key = normalize_text(query)
+        vec = self._lru_get(key)
+        if vec is None:
+            fut: Future = Future()
+            self._ensure_worker()
+            self._queue.put((key, fut))
+            vec = fut.result()
+        return vec.reshape(1, -1)
+
+    def embed_many(self, queries: List[str]) -> np.ndarray:
+        """Embed a whole batch at once (n, dim): LRU hits are reused, the distinct misses go through
+        a single ``encode`` call on the caller's thread instead of the micro-batching queue."""
+        keys = [normalize_text(q) for q in queries]
+        found: Dict[str, np.ndarray] = {}
+        for key in dict.fromkeys(keys):
+            vec = self._lru_get(key)
+            if vec is not None:
+                found[key] = vec
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            embs = _encode(missing, batch_size=min(len(missing), 64))
+            self.batches += 1
+            self.batched_queries += len(missing)
+            for key, vec in zip(missing, embs):
+                vec.setflags(write=False)
+                self._lru_put(key, vec)
+                found[key] = vec
+        if not keys:
+            return np.zeros((0, 0), dtype='float32')
+        return np.stack([found[key] for key in keys])
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'lru_entries': len(self._lru),
+            'hits': self.hits,
+            'misses': self.misses,
+            'batches': self.batches,
+            'batched_queries': self.batched_queries,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_query_embedder() -> QueryEmbedder:
+    settings = get_settings()
+    return QueryEmbedder(
+        max_batch=settings.query_embed_max_batch,
+        max_wait_ms=settings.query_embed_max_wait_ms,
+        lru_size=settings.query_embed_lru_size,
+    )
+
+
+def embed_query(query: str) -> np.ndarray:
+    return get_query_embedder().embed(query)
+
+
+def embed_queries(queries: List[str]) -> np.ndarray:
+    return get_query_embedder().embed_many(queries)
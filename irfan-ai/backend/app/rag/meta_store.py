@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class VectorMeta:
+    text: str
+    source: str
+    chunk_id: str
+    category: str
+
+
+def _open_blob(path: str) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype='uint8')
+    return np.memmap(path, dtype='uint8', mode='r')
+
+
+class ChunkMetaStore:
+    """Columnar, memory-mapped chunk metadata keyed by vector id.
+
+    A directory holds ``ids.npy`` (sorted int64), UTF-8 blobs ``text.bin`` / ``chunk_id.bin`` with
+    ``*_off.npy`` offset tables, and interned ``source_code.npy`` / ``category_code.npy`` columns
+    whose string tables live in ``strings.json``. Opening it only maps the files; a ``VectorMeta``
+    (and its text) is decoded only when ``get`` is called for that id.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = os.path.abspath(directory)
+        p = lambda name: os.path.join(self.directory, name)  # noqa: E731
+        self.ids: np.ndarray = np.load(p('ids.npy'), mmap_mode='r')
+        self._text_off = np.load(p('text_off.npy'), mmap_mode='r')
+        self._cid_off = np.load(p('chunk_id_off.npy'), mmap_mode='r')
+        self._source_code = np.load(p('source_code.npy'), mmap_mode='r')
+        self.category_code: np.ndarray = np.load(p('category_code.npy'), mmap_mode='r')
+        self._text = _open_blob(p('text.bin'))
+        self._cid = _open_blob(p('chunk_id.bin'))
+        with open(p('strings.json'), 'r', encoding='utf-8') as f:
+            strings = json.load(f)
+        self.sources: List[str] = strings['sources']
+        self.categories: List[str] = strings['categories']
+
+    def __len__(self) -> int:
+        return int(self.ids.shape[0])
+
+    def __contains__(self, vid: int) -> bool:
+        return self.row_of(vid) is not None
+
+    def row_of(self, vid: int) -> Optional[int]:
+        row = int(np.searchsorted(self.ids, vid))
+        if row < len(self) and int(self.ids[row]) == vid:
+            return row
+        return None
+
+    def text_bytes(self, row: int) -> bytes:
+        return self._text[self._text_off[row]:self._text_off[row + 1]].tobytes()
+
+    def text(self, row: int) -> str:
+        return self.text_bytes(row).decode('utf-8')
+
+    def chunk_id_bytes(self, row: int) -> bytes:
+        return self._cid[self._cid_off[row]:self._cid_off[row + 1]].tobytes()
+
+    def source(self, row: int) -> str:
+        return self.sources[int(self._source_code[row])]
+
+    def category(self, row: int) -> str:
+        return self.categories[int(self.category_code[row])]
+
+    def get(self, vid: int) -> Optional[VectorMeta]:
+        row = self.row_of(vid)
+        if row is None:
+            return None
+        return VectorMeta(
+            text=self.text(row),
+            source=self.source(row),
+            chunk_id=self.chunk_id_bytes(row).decode('utf-8'),
+            category=self.category(row),
+        )
+
+    def partitions(self) -> Dict[str, np.ndarray]:
+        """Lowercased category -> sorted ids, computed from the code column without decoding strings."""
+        out: Dict[str, List[np.ndarray]] = {}
+        codes = np.asarray(self.category_code)
+        for code, name in enumerate(self.categories):
+            ids = np.asarray(self.ids[codes == code], dtype='int64')
+            if ids.size:
+                out.setdefault(name.lower(), []).append(ids)
+        return {cat: (np.sort(np.concatenate(parts)) if len(parts) > 1 else parts[0]) for cat, parts in out.items()}
+
+    def values(self) -> Iterator[VectorMeta]:
+        for vid in self.ids:
+            meta = self.get(int(vid))
+            if meta is not None:
+                yield meta
+
+
+class ChunkMetaWriter:
+    """Streams rows (in ascending id order) into a new ChunkMetaStore directory."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = os.path.abspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._text_f = open(os.path.join(self.directory, 'text.bin'), 'wb')
+        self._cid_f = open(os.path.join(self.directory, 'chunk_id.bin'), 'wb')
+        self._ids: List[int] = []
+        self._text_off: List[int] = [0]
+        self._cid_off: List[int] = [0]
+        self._source_code: List[int] = []
+        self._category_code: List[int] = []
+        self._sources: Dict[str, int] = {}
+        self._categories: Dict[str, int] = {}
+
+    def _append(self, vid: int, text: bytes, source: str, chunk_id: bytes, category: str) -> None:
+        if self._ids and vid <= self._ids[-1]:
+            raise ValueError('ids must be added in ascending order')
+        self._ids.append(vid)
+        self._text_f.write(text)
+        self._text_off.append(self._text_off[-1] + len(text))
+        self._cid_f.write(chunk_id)
+        self._cid_off.append(self._cid_off[-1] + len(chunk_id))
+        self._source_code.append(self._sources.setdefault(source, len(self._sources)))
+        self._category_code.append(self._categories.setdefault(category, len(self._categories)))
+
+    def add(self, vid: int, text: str, source: str, chunk_id: str, category: str) -> None:
+        self._append(vid, text.encode('utf-8', errors='replace'), source, chunk_id.encode('utf-8', errors='replace'), category)
+
+    def copy_row(self, store: ChunkMetaStore, row: int) -> None:
+        # Raw byte copy: surviving rows of the previous generation are never decoded
+        self._append(int(store.ids[row]), store.text_bytes(row), store.source(row), store.chunk_id_bytes(row), store.category(row))
+
+    def close(self) -> ChunkMetaStore:
+        self._text_f.close()
+        self._cid_f.close()
+        p = lambda name: os.path.join(self.directory, name)  # noqa: E731
+        np.save(p('ids.npy'), np.asarray(self._ids, dtype='int64'))
+        np.save(p('text_off.npy'), np.asarray(self._text_off, dtype='int64'))
+        np.save(p('chunk_id_off.npy'), np.asarray(self._cid_off, dtype='int64'))
+        np.save(p('source_code.npy'), np.asarray(self._source_code, dtype='int32'))
+        np.save(p('category_code.npy'), np.asarray(self._category_code, dtype='int32'))
+        with open(p('strings.json'), 'w', encoding='utf-8') as f:
+            json.dump({'sources': list(self._sources), 'categories': list(self._categories)}, f, ensure_ascii=False)
+        return ChunkMetaStore(self.directory)
+
+
+def meta_rows(store: Optional[ChunkMetaStore], drop: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(rows, ids) of ``store`` that survive removing the ``drop`` ids."""
+    if store is None or not len(store):
+        return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64')
+    ids = np.asarray(store.ids, dtype='int64')
+    keep = ~np.isin(ids, drop) if drop.size else np.ones(ids.shape[0], dtype=bool)
+    rows = np.flatnonzero(keep)
+    return rows, ids[rows]
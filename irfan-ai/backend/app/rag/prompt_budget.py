@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence
+
+from ..config import get_settings
+
+try:  # tiktoken is optional; without it (or without its encoding files) token counts are estimated
+    import tiktoken
+except ImportError:  # pragma: no cover
+    tiktoken = None  # type: ignore[assignment]
+
+# BPE vocabularies rarely hold more than ~4 characters of a Turkish/Arabic word per token;
+# counting 4-character word slices plus punctuation tracks real counts closely and errs high
+_PIECE = re.compile(r'\w{1,4}|[^\w\s]')
+
+# Chat-format framing per message (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_PIECE.findall(text))
+
+
+@lru_cache(maxsize=4)
+def get_token_counter(encoding: str = '') -> Callable[[str], int]:
+    """Token counter for ``encoding`` (a tiktoken encoding name), falling back to ``estimate_tokens``."""
+    if tiktoken is not None and encoding:
+        try:
+            enc = tiktoken.get_encoding(encoding)
+        except Exception:  # noqa: BLE001 - unknown name, or encoding files not downloadable offline
+            enc = None
+        if enc is not None:
+            return lambda text: len(enc.encode(text, disallowed_special=()))
+    return estimate_tokens
+
+
+def count_message_tokens(messages: Sequence[Dict[str, str]], count: Callable[[str], int]) -> int:
+    return sum(count(m['content']) + MESSAGE_OVERHEAD for m in messages)
+
+
+def _truncate(text: str, max_tokens: int, count: Callable[[str], int]) -> str:
+    # Largest prefix within max_tokens (binary search over characters), cut back to a word boundary
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = text[:lo]
+    space = cut.rfind(' ')
+    if space > lo // 2:
+        cut = cut[:space]
+    return cut.rstrip() + ' …'
+
+
+@dataclass
+class FittedPrompt:
+    # Kept context blocks (possibly trimmed) with their positions in the ranked input, and kept history
+    blocks: List[str]
+    block_ids: List[int]
+    history: List[Dict[str, str]]
+    tokens: int
+    trimmed_blocks: int = 0
+    dropped_blocks: int = 0
+    dropped_history: int = 0
+    stats: Dict[str, int] = field(default_factory=dict)
+
+
+def fit_prompt(
+    fixed: Sequence[str],
+    blocks: Sequence[str],
+    history: Sequence[Dict[str, str]],
+    budget_tokens: int,
+    context_share: float = 0.6,
+    min_block_tokens: int = 64,
+    count: Callable[[str], int] = estimate_tokens,
+) -> FittedPrompt:
+    """Fit ranked context ``blocks`` and ``history`` (oldest first) into ``budget_tokens``.
+
+    ``fixed`` are the messages that are always sent (system policy, language prompt, user query).
+    Of what remains, context may use ``context_share`` plus whatever history leaves unused, and
+    history gets the rest. Context keeps the highest-ranked blocks, trimming the first one that no
+    longer fits when at least ``min_block_tokens`` remain; history keeps the newest turns.
+    """
+    fixed_tokens = sum(count(t) + MESSAGE_OVERHEAD for t in fixed)
+    remaining = max(0, budget_tokens - fixed_tokens)
+
+    hist_costs = [count(m['content']) + MESSAGE_OVERHEAD for m in history]
+    history_share = remaining - int(remaining * context_share)
+    context_cap = remaining - min(sum(hist_costs), history_share)
+
+    kept: List[str] = []
+    kept_ids: List[int] = []
+    trimmed = 0
+    # The context travels as one system message: one framing overhead, a blank line between blocks
+    used = MESSAGE_OVERHEAD + 2 if blocks else 0
+    for i, block in enumerate(blocks):
+        cost = count(block) + (2 if kept else 0)
+        if used + cost <= context_cap:
+            kept.append(block)
+            kept_ids.append(i)
+            used += cost
+            continue
+        room = context_cap - used - (2 if kept else 0)
+        if room >= min_block_tokens:
+            kept.append(_truncate(block, room - 2, count))
+            kept_ids.append(i)
+            used += count(kept[-1]) + (2 if len(kept) > 1 else 0)
+            trimmed += 1
+        break
+    if not kept:
+        used = 0
+
+    history_cap = remaining - used
+    kept_history: List[Dict[str, str]] = []
+    hist_used = 0
+    for m, cost in zip(reversed(history), reversed(hist_costs)):
+        if hist_used + cost > history_cap:
+            break
+        kept_history.append(m)
+        hist_used += cost
+    kept_history.reverse()
+
+    return FittedPrompt(
+        blocks=kept,
+        block_ids=kept_ids,
+        history=kept_history,
+        tokens=fixed_tokens + used + hist_used,
+        trimmed_blocks=trimmed,
+        dropped_blocks=len(blocks) - len(kept),
+        dropped_history=len(history) - len(kept_history),
+        stats={'fixed': fixed_tokens, 'context': used, 'history': hist_used},
+    )
+
+
+def prompt_counter() -> Callable[[str], int]:
+    return get_token_counter(get_settings().prompt_tokenizer)
+
+
+def clamp_max_tokens(requested: int, prompt_tokens: int, context_window: Optional[int] = None) -> int:
+    """Limit the completion so prompt + completion stays inside the model's context window."""
+    window = context_window if context_window is not None else get_settings().model_context_tokens
+    return max(1, min(int(requested), window - prompt_tokens))
@@ -1,84 +1,497 @@
-
 from __future__ import annotations
 
+import fcntl
+import hashlib
 import json
 import os
-from dataclasses import dataclass, asdict
-from typing import List, Tuple, Optional
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterator, List, Sequence, Set, Tuple, Optional
 
 import faiss  # type: ignore
 import numpy as np
 
-from ..retrieval.retriever import LocalTextRetriever
-from .embeddings import embed_texts
+from ..config import get_settings
+from ..retrieval.retriever import DocumentChunk, LocalTextRetriever
+from .ann import HNSW_EXACT_FILTER_RATIO, AnnConfig, build_index, resolve_kind, resolve_quantization, search_params, supports_remove
+from .embeddings import cached_embeddings, embed_queries, embed_query, embed_texts
+from .meta_store import ChunkMetaStore, ChunkMetaWriter, VectorMeta, meta_rows
+
+INDEX_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app_data', 'faiss'))
+
+# Unfinished generation directories older than this are leftovers of a crashed build
+_STALE_BUILD_SECONDS = 3600
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    # Immutable generation of the index; readers grab one reference and never see a half-built state.
+    # Vectors are stored under stable int64 ids (IndexIDMap2 / IVF ids) so one source can be added/removed alone.
+    index: faiss.Index
+    metas: ChunkMetaStore
+    sources: Dict[str, Tuple[str, int, int]]  # source -> (content signature, first id, count); ids of a source are contiguous
+    next_id: int
+    generation: int
+    kind: str
+    quant: str
+    trained_size: int
+    ann: AnnConfig
+    # Fingerprint of the retriever corpus this generation was synced with ('' after partial add/remove)
+    corpus: str = ''
+    # Category partitions: lowercased category -> sorted ids, and cached FAISS id selectors per filter
+    partitions: Dict[str, np.ndarray] = field(default_factory=dict)
+    selectors: Dict[FrozenSet[str], Any] = field(default_factory=dict)
+
+    def _filter(self, allowed_categories: Optional[Sequence[str]]) -> Tuple[Any, Optional[Any], Optional[Tuple[np.ndarray, np.ndarray]]]:
+        # (selector, search params, exact partition) per filter, built once per generation
+        key = frozenset(c.lower() for c in allowed_categories) if allowed_categories else frozenset()
+        cached = self.selectors.get(key)
+        if cached is None:
+            parts = [self.partitions[c] for c in key if c in self.partitions]
+            sel = exact = None
+            selectivity = 1.0
+            if parts:
+                ids = np.concatenate(parts) if len(parts) > 1 else parts[0]
+                selectivity = ids.size / max(1, self.index.ntotal)
+                sel = faiss.IDSelectorBatch(ids)
+                if self.kind == 'hnsw' and selectivity < HNSW_EXACT_FILTER_RATIO:
+                    # Small partition: its decoded vectors are scored directly (at most a tenth of the index)
+                    exact = (ids, self.index.reconstruct_batch(ids))
+            # Keep the selector referenced alongside the params that point at it
+            cached = (sel, search_params(self.kind, self.ann, sel, quant=self.quant, selectivity=selectivity), exact)
+            self.selectors[key] = cached
+        return cached
+
+    def search_params(self, allowed_categories: Optional[Sequence[str]]) -> Optional[Any]:
+        """FAISS search parameters: nprobe/efSearch tuning plus, for filtered queries, an id selector
+        restricting the search to the allowed categories' partition.
+
+        The filter is dropped (global search) when none of the categories exist.
+        """
+        return self._filter(allowed_categories)[1]
+
+    def exact_partition(self, allowed_categories: Optional[Sequence[str]]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(ids, vectors) of a filter's partition when it is searched exactly instead of through HNSW."""
+        return self._filter(allowed_categories)[2]
+
+
+def _exact_search(q_embs: np.ndarray, ids: np.ndarray, vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Same (sims, ids) layout as faiss.Index.search, padded with -1 when the partition has fewer than k vectors
+    sims = q_embs @ vecs.T
+    n = min(k, ids.size)
+    top = np.argpartition(-sims, n - 1, axis=1)[:, :n] if n < ids.size else np.tile(np.arange(ids.size), (sims.shape[0], 1))
+    top_sims = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_sims, axis=1, kind='stable')
+    out_sims = np.full((q_embs.shape[0], k), -np.inf, dtype='float32')
+    out_ids = np.full((q_embs.shape[0], k), -1, dtype='int64')
+    out_sims[:, :n] = np.take_along_axis(top_sims, order, axis=1)
+    out_ids[:, :n] = ids[np.take_along_axis(top, order, axis=1)]
+    return out_sims, out_ids
+
+
+def _source_signature(texts: Sequence[str]) -> str:
+    h = hashlib.sha1()
+    for t in texts:
+        h.update(t.encode('utf-8', errors='ignore'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+def _group_by_source(chunks: Sequence[DocumentChunk]) -> Dict[str, List[DocumentChunk]]:
+    grouped: Dict[str, List[DocumentChunk]] = {}
+    for c in chunks:
+        grouped.setdefault(c.source, []).append(c)
+    return grouped
 
 
-@dataclass
-class VectorMeta:
-    text: str
-    source: str
-    chunk_id: str
-    category: str
+def _source_ids(entry: Tuple[str, int, int]) -> np.ndarray:
+    _sig, first, count = entry
+    return np.arange(first, first + count, dtype='int64')
 
 
 class FaissVectorStore:
-    def __init__(self, index_dir: str) -> None:
+    """Id-mapped FAISS index plus a columnar chunk metadata store, persisted as generations.
+
+    Every build is written to its own ``gen-*`` directory (``index.faiss``, ``meta/`` and, last,
+    ``manifest.json``) and published by atomically rewriting the ``CURRENT`` pointer, so a crash
+    never leaves a half-written index behind and memory-mapped metadata of the previous
+    generation stays valid for in-flight searches.
+
+    Several worker processes may share one directory: searches reload whenever ``CURRENT`` was
+    replaced since this process loaded it, and builds run under an exclusive lock on ``LOCK``,
+    starting from the generation ``CURRENT`` points at under that lock.
+    """
+
+    def __init__(self, index_dir: str, ann: Optional[AnnConfig] = None) -> None:
         self.index_dir = os.path.abspath(index_dir)
+        self.ann = ann or AnnConfig.from_settings(get_settings())
         os.makedirs(self.index_dir, exist_ok=True)
-        self.index_path = os.path.join(self.index_dir, 'index.faiss')
-        self.meta_path = os.path.join(self.index_dir, 'meta.json')
-        self.index: Optional[faiss.Index] = None
-        self.metas: List[VectorMeta] = []
+        self.current_path = os.path.join(self.index_dir, 'CURRENT')
+        self.lock_path = os.path.join(self.index_dir, 'LOCK')
+        self._snapshot: Optional[_Snapshot] = None
+        self._generation = 0
+        self._load_attempted = False
+        # Stamp of the CURRENT file the served snapshot was loaded from (or published as)
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> Optional[faiss.Index]:
+        snap = self._snapshot
+        return snap.index if snap is not None else None
+
+    @property
+    def metas(self) -> List[VectorMeta]:
+        # Materializes every chunk; only meant for debugging / small corpora
+        snap = self._snapshot
+        return list(snap.metas.values()) if snap is not None else []
+
+    @property
+    def generation(self) -> int:
+        # Picks up a generation published by another process first, so caches keyed on it follow
+        self._ensure_loaded()
+        return self._generation
+
+    def _swap(self, snapshot: Optional[_Snapshot]) -> None:
+        # Single reference assignment: in-flight searches keep using the previous snapshot
+        self._generation += 1
+        self._snapshot = snapshot
+
+    def _new_snapshot(self, index: faiss.Index, metas: ChunkMetaStore, sources: Dict[str, Tuple[str, int, int]], next_id: int, kind: str, quant: str, trained_size: int, corpus: str = '') -> _Snapshot:
+        return _Snapshot(
+            index=index, metas=metas, sources=sources, next_id=next_id, generation=self._generation + 1,
+            kind=kind, quant=quant, trained_size=trained_size, ann=self.ann, corpus=corpus, partitions=metas.partitions(),
+        )
+
+    def _new_generation_dir(self) -> str:
+        path = os.path.join(self.index_dir, f'gen-{time.time_ns()}-{os.getpid()}')
+        os.makedirs(path)
+        return path
+
+    def _current_stamp(self) -> Optional[Tuple[int, int]]:
+        # CURRENT is replaced (new inode, new mtime) on every publish; one stat detects that
+        try:
+            st = os.stat(self.current_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _current_dir(self) -> Optional[str]:
+        try:
+            with open(self.current_path, 'r', encoding='utf-8') as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(self.index_dir, name)
+        if not name or not os.path.exists(os.path.join(path, 'manifest.json')):
+            return None
+        return path
+
+    def _publish(self, gen_dir: str, snap: _Snapshot) -> None:
+        faiss.write_index(snap.index, os.path.join(gen_dir, 'index.faiss'))
+        manifest = {
+            'next_id': snap.next_id,
+            'kind': snap.kind,
+            'quant': snap.quant,
+            'trained_size': snap.trained_size,
+            'corpus': snap.corpus,
+            'sources': {src: {'signature': sig, 'first_id': first, 'count': count} for src, (sig, first, count) in snap.sources.items()},
+        }
+        # The manifest marks the generation as complete; CURRENT only ever points at complete ones
+        with open(os.path.join(gen_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        tmp = self.current_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(os.path.basename(gen_dir))
+        os.replace(tmp, self.current_path)
+        self._stamp = self._current_stamp()
+        keep = {os.path.basename(gen_dir)}
+        served = self._snapshot
+        if served is not None:
+            keep.add(os.path.basename(os.path.dirname(served.metas.directory)))
+        self._prune(keep)
+
+    def _prune(self, keep: Set[str]) -> None:
+        # Keep the published generation and the one still being served; drop older ones, and
+        # unfinished builds once they are clearly abandoned
+        now = time.time()
+        for name in os.listdir(self.index_dir):
+            path = os.path.join(self.index_dir, name)
+            if not name.startswith('gen-') or name in keep or not os.path.isdir(path):
+                continue
+            complete = os.path.exists(os.path.join(path, 'manifest.json'))
+            if complete or now - os.path.getmtime(path) > _STALE_BUILD_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        # Single-file layout of older versions (index.faiss + meta.json at the top level)
+        for legacy in ('index.faiss', 'meta.json'):
+            legacy_path = os.path.join(self.index_dir, legacy)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
 
-    def _save(self) -> None:
-        assert self.index is not None
-        faiss.write_index(self.index, self.index_path)
-        with open(self.meta_path, 'w', encoding='utf-8') as f:
-            json.dump([asdict(m) for m in self.metas], f, ensure_ascii=False)
+    def _clear(self) -> None:
+        self._swap(None)
+        if os.path.exists(self.current_path):
+            os.remove(self.current_path)
+        self._stamp = None
+        self._prune(keep=set())
 
     def _load(self) -> bool:
-        if not (os.path.exists(self.index_path) and os.path.exists(self.meta_path)):
+        # Caller holds self._lock. The stamp is taken before CURRENT is read: a publish racing with
+        # this load leaves a stale stamp behind, which only causes one more reload.
+        self._load_attempted = True
+        self._stamp = self._current_stamp()
+        gen_dir = self._current_dir()
+        if gen_dir is None:
+            # Nothing published yet (or only the legacy meta.json layout): the caller rebuilds.
+            # A generation that another process cleared is no longer served either.
+            if self._snapshot is not None:
+                self._swap(None)
             return False
-        self.index = faiss.read_index(self.index_path)
-        with open(self.meta_path, 'r', encoding='utf-8') as f:
-            raw = json.load(f)
-        self.metas = [VectorMeta(**m) for m in raw]
+        served = self._snapshot
+        if served is not None and os.path.dirname(served.metas.directory) == gen_dir:
+            return True
+        try:
+            with open(os.path.join(gen_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            index = faiss.read_index(os.path.join(gen_dir, 'index.faiss'))
+            metas = ChunkMetaStore(os.path.join(gen_dir, 'meta'))
+        except (FileNotFoundError, RuntimeError):
+            # Pruned by a newer publish while being read; the changed stamp makes the next call retry
+            self._stamp = None
+            return served is not None
+        sources = {src: (v['signature'], int(v['first_id']), int(v['count'])) for src, v in raw.get('sources', {}).items()}
+        snap = self._new_snapshot(
+            index, metas, sources, int(raw.get('next_id', 0)),
+            kind=raw.get('kind', 'flat'), quant=raw.get('quant', 'none'), trained_size=int(raw.get('trained_size', len(metas))),
+            corpus=raw.get('corpus', ''),
+        )
+        self._swap(snap)
         return True
 
+    def load(self) -> bool:
+        with self._lock:
+            return self._load()
+
+    def _stale(self) -> bool:
+        return not self._load_attempted or self._current_stamp() != self._stamp
+
+    def _ensure_loaded(self) -> Optional[_Snapshot]:
+        # CURRENT is checked on every call: another worker process may have published (or cleared)
+        # a generation. While this process is itself building, searches keep the served snapshot
+        # instead of waiting for the build; only the very first load blocks.
+        if self._stale() and self._lock.acquire(blocking=not self._load_attempted):
+            try:
+                if self._stale():
+                    self._load()
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    @contextmanager
+    def _building(self) -> Iterator[Optional[_Snapshot]]:
+        # Builds of all processes sharing the directory are serialized on the LOCK file, and the base
+        # generation is re-read under it, so a build never starts from a generation another process
+        # has replaced (which would drop that process' sources when this one publishes)
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            if self._stale():
+                self._load()
+            yield self._snapshot
+
+    def _needs_rebuild(self, base: Optional[_Snapshot], kind: str, quant: str, n_total: int, removing: bool) -> bool:
+        if base is None or base.kind != kind or base.quant != quant:
+            return True
+        if removing and not supports_remove(kind):
+            return True
+        # IVF centroids / quantizer codebooks trained on a much smaller corpus no longer fit it well
+        return (kind == 'ivf' or quant != 'none') and n_total > 4 * max(base.trained_size, 1)
+
+    def _apply(self, base: Optional[_Snapshot], upserts: Dict[str, List[DocumentChunk]], removals: Sequence[str], corpus: str = '') -> Tuple[int, int]:
+        sources = dict(base.sources) if base is not None else {}
+        next_id = base.next_id if base is not None else 0
+
+        drop_parts: List[np.ndarray] = []
+        for src in list(removals) + [s for s in upserts if s in sources]:
+            entry = sources.pop(src, None)
+            if entry is not None:
+                drop_parts.append(_source_ids(entry))
+        drop_ids = np.concatenate(drop_parts) if drop_parts else np.zeros(0, dtype='int64')
+        keep_rows, keep_ids = meta_rows(base.metas if base is not None else None, drop_ids)
+        removed = int(drop_ids.size)
+
+        new_chunks = [c for chunks in upserts.values() for c in chunks]
+        new_ids = np.arange(next_id, next_id + len(new_chunks), dtype='int64')
+        for src, chunks in upserts.items():
+            sources[src] = (_source_signature([c.text for c in chunks]), next_id, len(chunks))
+            next_id += len(chunks)
+
+        n_total = int(keep_ids.size) + len(new_chunks)
+        if not n_total:
+            self._clear()
+            self._load_attempted = True
+            return len(new_chunks), removed
+
+        # Surviving rows are copied as raw bytes; new ids are above every existing id, so the
+        # id column stays sorted without a merge
+        gen_dir = self._new_generation_dir()
+        writer = ChunkMetaWriter(os.path.join(gen_dir, 'meta'))
+        if base is not None:
+            for row in keep_rows:
+                writer.copy_row(base.metas, int(row))
+        for i, c in zip(new_ids, new_chunks):
+            writer.add(int(i), c.text, c.source, c.chunk_id, c.category)
+        metas = writer.close()
+
+        new_embs = embed_texts([c.text for c in new_chunks]) if new_chunks else None
+        kind = resolve_kind(self.ann, n_total)
+        quant = resolve_quantization(self.ann, n_total)
+        if self._needs_rebuild(base, kind, quant, n_total, bool(drop_ids.size)):
+            # Full (re)build, e.g. on first build, index-type change or retraining. Vectors of
+            # already-indexed chunks come back from the embedding cache instead of the model.
+            parts, id_parts = [], []
+            if keep_ids.size:
+                assert base is not None
+                parts.append(embed_texts([base.metas.text(int(r)) for r in keep_rows]))
+                id_parts.append(keep_ids)
+            if new_embs is not None:
+                parts.append(new_embs)
+                id_parts.append(new_ids)
+            vectors = np.concatenate(parts) if len(parts) > 1 else parts[0]
+            index = build_index(kind, self.ann, vectors, np.concatenate(id_parts), quant=quant)
+            trained_size = n_total
+        else:
+            assert base is not None
+            # Copy-on-write: mutate a clone so concurrent searches on the current snapshot stay valid
+            index = faiss.clone_index(base.index)
+            if drop_ids.size:
+                index.remove_ids(drop_ids)
+            if new_embs is not None:
+                index.add_with_ids(new_embs, new_ids)
+            trained_size = base.trained_size
+
+        snap = self._new_snapshot(index, metas, sources, next_id, kind=kind, quant=quant, trained_size=trained_size, corpus=corpus)
+        self._publish(gen_dir, snap)
+        self._swap(snap)
+        self._load_attempted = True
+        return len(new_chunks), removed
+
     def build_from_retriever(self, retriever: LocalTextRetriever) -> int:
         # Build from scratch using retriever chunks
-        texts = [c.text for c in retriever._chunks]
-        if not texts:
-            self.index = None
-            self.metas = []
-            if os.path.exists(self.index_path):
-                os.remove(self.index_path)
-            if os.path.exists(self.meta_path):
-                os.remove(self.meta_path)
-            return 0
-        embs = embed_texts(texts)
-        dim = embs.shape[1]
-        index = faiss.IndexFlatIP(dim)  # cosine if normalized
-        index.add(embs)
-        self.index = index
-        self.metas = [VectorMeta(text=c.text, source=c.source, chunk_id=c.chunk_id, category=c.category) for c in retriever._chunks]
-        self._save()
-        return len(self.metas)
+        with self._building():
+            added, _removed = self._apply(None, _group_by_source(list(retriever._chunks)), [], corpus=retriever.corpus_fingerprint or '')
+        return added
+
+    def add_source(self, chunks: Sequence[DocumentChunk]) -> int:
+        """Add (or replace) the chunks of the given source file(s); only these chunks are embedded."""
+        with self._building() as base:
+            added, _removed = self._apply(base, _group_by_source(chunks), [])
+        return added
+
+    def remove_source(self, source: str) -> int:
+        with self._building() as base:
+            _added, removed = self._apply(base, {}, [source])
+        return removed
+
+    def sync_with_retriever(self, retriever: LocalTextRetriever) -> Tuple[int, int]:
+        """Bring the index in line with the retriever, re-embedding only sources whose chunks changed.
+
+        When the retriever's corpus fingerprint matches the one this generation was synced with,
+        nothing is re-hashed or re-embedded.
+        """
+        corpus = retriever.corpus_fingerprint or ''
+        with self._building() as base:
+            current = (resolve_kind(self.ann, len(base.metas)), resolve_quantization(self.ann, len(base.metas))) if base is not None else None
+            if base is not None and corpus and base.corpus == corpus and (base.kind, base.quant) == current:
+                return 0, 0
+            grouped = _group_by_source(list(retriever._chunks))
+            known = base.sources if base is not None else {}
+            upserts = {
+                src: chunks for src, chunks in grouped.items()
+                if src not in known or known[src][0] != _source_signature([c.text for c in chunks])
+            }
+            removals = [src for src in known if src not in grouped]
+            if not upserts and not removals and base is not None and (base.kind, base.quant) == current:
+                return 0, 0
+            return self._apply(base, upserts, removals, corpus=corpus)
+
+    def _rescore(self, q_emb: np.ndarray, hits: List[Tuple[int, VectorMeta, float]], k: int) -> List[Tuple[int, VectorMeta, float]]:
+        # Exact inner products from the float32 embedding cache; candidates missing there keep their approximate score
+        vecs, hit = cached_embeddings([m.text for _i, m, _s in hits])
+        if vecs is None:
+            return hits[:k]
+        exact = vecs @ q_emb[0]
+        scores = np.array([s for _i, _m, s in hits], dtype='float32')
+        scores[hit] = exact
+        order = np.argsort(-scores, kind='stable')[:k]
+        return [(hits[i][0], hits[i][1], float(scores[i])) for i in order]
+
+    def _search_batch(self, snap: _Snapshot, q_embs: np.ndarray, k: int, allowed_categories: Optional[List[str]]) -> List[List[Tuple[int, VectorMeta, float]]]:
+        rescore = snap.quant != 'none' and snap.ann.rescore
+        fetch = k * max(1, snap.ann.rescore_factor) if rescore else k
+        # Filtered queries search only their category partition, so k hits come back whenever they exist
+        params = snap.search_params(allowed_categories)
+        exact = snap.exact_partition(allowed_categories)
+        if exact is not None:
+            sims, idxs = _exact_search(q_embs, exact[0], exact[1], fetch)
+        elif params is not None:
+            sims, idxs = snap.index.search(q_embs, fetch, params=params)
+        else:
+            sims, idxs = snap.index.search(q_embs, fetch)
+        out: List[List[Tuple[int, VectorMeta, float]]] = []
+        for row in range(q_embs.shape[0]):
+            results: List[Tuple[int, VectorMeta, float]] = []
+            for score, idx in zip(sims[row], idxs[row]):
+                m = snap.metas.get(int(idx)) if idx >= 0 else None
+                if m is None:
+                    continue
+                results.append((int(idx), m, float(score)))
+            if rescore and results:
+                results = self._rescore(q_embs[row:row + 1], results, k)
+            out.append(results)
+        return out
+
+    def _search(self, query: str, k: int, allowed_categories: Optional[List[str]]) -> List[Tuple[int, VectorMeta, float]]:
+        snap = self._ensure_loaded()
+        if snap is None:
+            return []
+        return self._search_batch(snap, embed_query(query), k, allowed_categories)[0]
 
     def search(self, query: str, k: int = 5, allowed_categories: Optional[List[str]] = None) -> List[Tuple[VectorMeta, float]]:
-        if self.index is None:
-            if not self._load():
-                return []
-        assert self.index is not None
-        q_emb = embed_texts([query])
-        sims, idxs = self.index.search(q_emb, k)
-        results: List[Tuple[VectorMeta, float]] = []
-        for score, idx in zip(sims[0], idxs[0]):
-            if idx < 0 or idx >= len(self.metas):
-                continue
-            m = self.metas[idx]
-            if allowed_categories and m.category.lower() not in {c.lower() for c in allowed_categories}:
-                continue
-            results.append((m, float(score)))
-        return results
+        return [(m, s) for _i, m, s in self._search(query, k, allowed_categories)]
+
+    def search_ids(self, query: str, k: int = 5, allowed_categories: Optional[List[str]] = None) -> List[Tuple[int, VectorMeta, float]]:
+        """Like ``search`` but also returns each hit's vector id (stable within a generation)."""
+        return self._search(query, k, allowed_categories)
+
+    def search_ids_batch(self, queries: List[str], k: int = 5, allowed_categories: Optional[List[str]] = None) -> List[List[Tuple[int, VectorMeta, float]]]:
+        """``search_ids`` for many queries sharing one category filter: one batched embedding and one FAISS search."""
+        snap = self._ensure_loaded()
+        if snap is None or not queries:
+            return [[] for _q in queries]
+        return self._search_batch(snap, embed_queries(queries), k, allowed_categories)
+
+    def get_meta(self, vector_id: int) -> Optional[VectorMeta]:
+        snap = self._ensure_loaded()
+        return snap.metas.get(vector_id) if snap is not None else None
+
+
+# Process-wide resident store, owned by the app lifecycle (see main.on_startup)
+_GLOBAL: Optional[FaissVectorStore] = None
+_GLOBAL_LOCK = threading.Lock()
+
+
+def init_vector_store(index_dir: str | None = None) -> FaissVectorStore:
+    global _GLOBAL
+    with _GLOBAL_LOCK:
+        if _GLOBAL is None or (index_dir is not None and _GLOBAL.index_dir != os.path.abspath(index_dir)):
+            _GLOBAL = FaissVectorStore(index_dir=index_dir or INDEX_DIR, ann=AnnConfig.from_settings(get_settings()))
+        return _GLOBAL
+
 
+def get_vector_store() -> FaissVectorStore:
+    if _GLOBAL is None:
+        return init_vector_store()
+    return _GLOBAL
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def count_postings(docs: Iterable[Sequence[str]], vocab: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Doc-major postings of tokenized documents: (doc_ptr, term ids, term frequencies).
+
+    The postings of document ``i`` are ``terms[doc_ptr[i]:doc_ptr[i + 1]]``. New tokens are
+    interned into ``vocab`` in place.
+    """
+    terms: List[int] = []
+    tfs: List[int] = []
+    doc_ptr: List[int] = [0]
+    for tokens in docs:
+        for tok, tf in Counter(tokens).items():
+            tid = vocab.get(tok)
+            if tid is None:
+                tid = vocab[tok] = len(vocab)
+            terms.append(tid)
+            tfs.append(tf)
+        doc_ptr.append(len(terms))
+    return np.asarray(doc_ptr, dtype='int64'), np.asarray(terms, dtype='int32'), np.asarray(tfs, dtype='int32')
+
+
+class BM25Index:
+    """Okapi BM25 over term-major postings (CSR arrays) with interned vocabulary ids.
+
+    Scoring matches ``rank_bm25.BM25Okapi`` (k1, b, epsilon-floored idf, repeated query terms
+    counted repeatedly) but only touches the postings of the query terms. Per-posting
+    ``tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))`` weights are precomputed at build time.
+    Within each term the postings are partitioned by category, so a filtered query only reads
+    the postings of its own categories.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> None:
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.vocab: Dict[str, int] = {}
+        self.indptr = np.zeros(1, dtype='int64')
+        self.doc_ids = np.zeros(0, dtype='int32')
+        self.weights = np.zeros(0, dtype='float32')
+        self.idf = np.zeros(0, dtype='float32')
+        self.doc_len = np.zeros(0, dtype='int32')
+        self.avgdl = 0.0
+        self.categories: Dict[str, int] = {}
+        self.post_cats = np.zeros(0, dtype='int16')
+
+    @property
+    def num_docs(self) -> int:
+        return int(self.doc_len.shape[0])
+
+    @classmethod
+    def build(cls, docs: Iterable[Sequence[str]], categories: Sequence[str], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> 'BM25Index':
+        vocab: Dict[str, int] = {}
+        doc_ptr, terms, tfs = count_postings(docs, vocab)
+        return cls.from_postings(vocab, doc_ptr, terms, tfs, categories, k1=k1, b=b, epsilon=epsilon)
+
+    @classmethod
+    def from_postings(
+        cls, vocab: Dict[str, int], doc_ptr: np.ndarray, terms: np.ndarray, tfs: np.ndarray, categories: Sequence[str],
+        k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25,
+    ) -> 'BM25Index':
+        """Build from doc-major postings (see ``count_postings``); no tokenization involved."""
+        self = cls(k1=k1, b=b, epsilon=epsilon)
+        self.vocab = vocab
+        n_docs = int(doc_ptr.shape[0]) - 1
+        docs = np.repeat(np.arange(n_docs, dtype='int32'), np.diff(doc_ptr))
+        # Document length in tokens is the sum of its term frequencies
+        doc_len = np.bincount(docs, weights=tfs, minlength=n_docs).astype('int32')
+        self._finalize(np.asarray(terms, dtype='int32'), docs, np.asarray(tfs, dtype='float32'), doc_len, categories)
+        return self
+
+    def _finalize(self, terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray, doc_len: np.ndarray, categories: Sequence[str]) -> None:
+        n_docs = int(doc_len.shape[0])
+        n_terms = len(self.vocab)
+        self.categories = {}
+        doc_cat = np.fromiter(
+            (self.categories.setdefault(c.lower(), len(self.categories)) for c in categories), dtype='int16', count=n_docs,
+        )
+        # Postings ordered by (term, category, doc): each term span holds contiguous category segments
+        order = np.lexsort((docs, doc_cat[docs], terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        counts = np.bincount(terms, minlength=n_terms)
+        self.indptr = np.zeros(n_terms + 1, dtype='int64')
+        np.cumsum(counts, out=self.indptr[1:])
+        df = counts.astype('float64')
+        self.doc_ids = docs
+        self.post_cats = doc_cat[docs]
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.sum()) / n_docs if n_docs else 0.0
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        if n_terms:
+            idf[idf < 0] = self.epsilon * float(idf.mean())
+        self.idf = idf.astype('float32')
+        if n_docs and self.avgdl > 0:
+            norm = self.k1 * (1.0 - self.b + self.b * doc_len[docs] / self.avgdl)
+            self.weights = (tfs * (self.k1 + 1.0) / (tfs + norm)).astype('float32')
+        else:
+            self.weights = np.zeros(docs.shape[0], dtype='float32')
+
+    def _allowed_codes(self, allowed_categories: Optional[Sequence[str]]) -> Optional[List[int]]:
+        if not allowed_categories:
+            return None
+        codes = sorted({self.categories[c.lower()] for c in allowed_categories if c.lower() in self.categories})
+        return codes or None
+
+    def _spans(self, term: int, codes: Optional[List[int]]) -> List[Tuple[int, int]]:
+        start, end = int(self.indptr[term]), int(self.indptr[term + 1])
+        if codes is None:
+            return [(start, end)]
+        cats = self.post_cats[start:end]
+        lo = np.searchsorted(cats, codes, side='left')
+        hi = np.searchsorted(cats, codes, side='right')
+        return [(start + int(a), start + int(b)) for a, b in zip(lo, hi) if b > a]
+
+    def term_ids(self, tokens: Sequence[str]) -> Dict[int, int]:
+        """Known query term ids with their multiplicity."""
+        counts: Dict[int, int] = {}
+        for tok in tokens:
+            tid = self.vocab.get(tok)
+            if tid is not None:
+                counts[tid] = counts.get(tid, 0) + 1
+        return counts
+
+    def top_k(self, query_tokens: Sequence[str], k: int = 5, allowed_categories: Optional[Sequence[str]] = None) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (doc id, score) pairs with positive score, best first.
+
+        With ``allowed_categories`` only documents of those categories are ranked; if none of the
+        categories exist in the corpus the filter is ignored.
+        """
+        if k <= 0 or not self.num_docs:
+            return []
+        q = self.term_ids(query_tokens)
+        if not q:
+            return []
+        codes = self._allowed_codes(allowed_categories)
+        spans = [(a, b, float(self.idf[t]) * n) for t, n in q.items() for a, b in self._spans(t, codes)]
+        if not spans:
+            return []
+        cand = np.concatenate([self.doc_ids[a:b] for a, b, _w in spans])
+        contrib = np.concatenate([self.weights[a:b] * w for a, b, w in spans])
+        cand, inverse = np.unique(cand, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib)
+        positive = scores > 0
+        cand, scores = cand[positive], scores[positive]
+        if not cand.size:
+            return []
+        if cand.size > k:
+            # Partial selection; ties at the cut keep the lowest doc ids (cand is ascending), like a stable sort
+            kth = np.partition(scores, cand.size - k)[cand.size - k]
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[:k - above.size]
+            sel = np.concatenate([above, ties])
+            cand, scores = cand[sel], scores[sel]
+        order = np.lexsort((cand, -scores))
+        return [(int(cand[i]), float(scores[i])) for i in order]
+
+    def nbytes(self) -> int:
+        return int(self.indptr.nbytes + self.doc_ids.nbytes + self.post_cats.nbytes + self.weights.nbytes + self.idf.nbytes + self.doc_len.nbytes)
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ..config import get_settings
+from ..rag.meta_store import VectorMeta
+from ..rag.vector_store import FaissVectorStore, get_vector_store
+from .result_cache import HitRef, RetrievalCache, get_retrieval_cache, retrieval_cache_key
+from .retriever import DocumentChunk, LocalTextRetriever, get_retriever
+
+
+@dataclass
+class HybridHit:
+    # kind 'v' = dense (vector id), 'b' = BM25 (chunk index); doc carries text/source/chunk_id/category
+    kind: str
+    ident: int
+    doc: Union[VectorMeta, DocumentChunk]
+    score: float
+
+
+def index_generation(vector_store: Optional[FaissVectorStore] = None, retriever: Optional[LocalTextRetriever] = None) -> Hashable:
+    """Token that changes whenever either index is rebuilt; caches of retrieval-derived data key on it."""
+    vs = vector_store or get_vector_store()
+    retriever = retriever or get_retriever()
+    return (vs.generation, retriever.corpus_fingerprint or id(retriever))
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    if scores.size == 0:
+        return scores
+    lo, hi = float(scores.min()), float(scores.max())
+    if hi - lo <= 1e-12:
+        return np.ones_like(scores)
+    return (scores - lo) / (hi - lo)
+
+
+def fuse(
+    ranked: Sequence[Tuple[np.ndarray, np.ndarray]],
+    n: int,
+    method: str = 'rrf',
+    rrf_k: int = 60,
+    weights: Optional[Sequence[float]] = None,
+) -> np.ndarray:
+    """Fused score per candidate slot.
+
+    ``ranked`` holds one (slots, scores) pair per source list, both in rank order; ``slots`` maps
+    each hit to a deduplicated candidate in ``[0, n)``. ``rrf`` sums ``w / (rrf_k + rank)``;
+    ``score`` sums min-max normalized scores, so the two lists' scales do not matter.
+    """
+    fused = np.zeros(n, dtype='float64')
+    weights = list(weights) if weights is not None else [1.0] * len(ranked)
+    for (slots, scores), w in zip(ranked, weights):
+        if slots.size == 0:
+            continue
+        if method == 'score':
+            contrib = _min_max(scores.astype('float64'))
+        else:
+            contrib = 1.0 / (rrf_k + np.arange(1, slots.size + 1, dtype='float64'))
+        np.add.at(fused, slots, w * contrib)
+    return fused
+
+
+class HybridRetriever:
+    """Dense (FAISS) + sparse (BM25) retrieval fused into one ranked list.
+
+    Both searches draw ``k * candidate_factor`` candidates; the dense one runs on a worker
+    thread while BM25 runs on the caller's, so latency is roughly the slower of the two.
+    Candidates are deduplicated by (source, chunk_id) and ranked by reciprocal-rank fusion
+    (default) or normalized-score fusion. With a cache, the fused id references are stored per
+    (query, categories, k) and reused until the index generation changes.
+    """
+
+    def __init__(
+        self,
+        vector_store: Optional[FaissVectorStore] = None,
+        retriever: Optional[LocalTextRetriever] = None,
+        fusion: str = 'rrf',
+        rrf_k: int = 60,
+        candidate_factor: int = 4,
+        dense_weight: float = 0.5,
+        cache: Optional[RetrievalCache] = None,
+        max_workers: int = 4,
+    ) -> None:
+        # None -> resolve the process-wide stores on every call, so rebuilt indexes are picked up
+        self._vector_store = vector_store
+        self._retriever = retriever
+        self.fusion = fusion
+        self.rrf_k = max(1, int(rrf_k))
+        self.candidate_factor = max(1, int(candidate_factor))
+        self.dense_weight = min(1.0, max(0.0, float(dense_weight)))
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix='hybrid-dense')
+
+    @property
+    def vector_store(self) -> FaissVectorStore:
+        return self._vector_store or get_vector_store()
+
+    @property
+    def retriever(self) -> LocalTextRetriever:
+        return self._retriever or get_retriever()
+
+    def generation(self) -> Hashable:
+        return index_generation(self.vector_store, self.retriever)
+
+    def _resolve(self, refs: List[HitRef], vs: FaissVectorStore, retriever: LocalTextRetriever) -> Optional[List[HybridHit]]:
+        hits: List[HybridHit] = []
+        for kind, ident, score in refs:
+            doc = vs.get_meta(ident) if kind == 'v' else retriever.chunk(ident)
+            if doc is None:
+                # Index changed in between; recompute
+                return None
+            hits.append(HybridHit(kind=kind, ident=ident, doc=doc, score=score))
+        return hits
+
+    def _fuse(
+        self,
+        dense: List[Tuple[int, VectorMeta, float]],
+        sparse: List[Tuple[int, float]],
+        retriever: LocalTextRetriever,
+        k: int,
+    ) -> List[HybridHit]:
+        slot_of: Dict[Tuple[str, str], int] = {}
+        candidates: List[Tuple[str, int, Union[VectorMeta, DocumentChunk]]] = []
+
+        def slots_for(items: List[Tuple[str, int, Union[VectorMeta, DocumentChunk]]]) -> np.ndarray:
+            out = np.empty(len(items), dtype='int64')
+            for pos, (kind, ident, doc) in enumerate(items):
+                key = (doc.source, doc.chunk_id)
+                slot = slot_of.get(key)
+                if slot is None:
+                    slot = slot_of[key] = len(candidates)
+                    candidates.append((kind, ident, doc))
+                out[pos] = slot
+            return out
+
+        dense_slots = slots_for([('v', i, m) for i, m, _s in dense])
+        sparse_slots = slots_for([('b', i, retriever.chunk(i)) for i, _s in sparse])
+        fused = fuse(
+            [
+                (dense_slots, np.array([s for _i, _m, s in dense], dtype='float32')),
+                (sparse_slots, np.array([s for _i, s in sparse], dtype='float32')),
+            ],
+            len(candidates),
+            method=self.fusion,
+            rrf_k=self.rrf_k,
+            weights=(self.dense_weight, 1.0 - self.dense_weight) if self.fusion == 'score' else None,
+        )
+        # Stable: ties keep candidate order, i.e. dense hits first
+        order = np.argsort(-fused, kind='stable')[:k]
+        return [HybridHit(kind=candidates[i][0], ident=candidates[i][1], doc=candidates[i][2], score=float(fused[i])) for i in order]
+
+    def retrieve(self, query: str, k: int = 5, allowed_categories: Optional[List[str]] = None) -> List[HybridHit]:
+        vs, retriever = self.vector_store, self.retriever
+        generation = index_generation(vs, retriever)
+        key = retrieval_cache_key(query, allowed_categories, k)
+        if self.cache is not None:
+            refs = self.cache.get(key, generation)
+            if refs is not None:
+                cached = self._resolve(refs, vs, retriever)
+                if cached is not None:
+                    return cached
+
+        pool = k * self.candidate_factor
+        dense_future = self._pool.submit(vs.search_ids, query, pool, allowed_categories)
+        try:
+            sparse = retriever.retrieve_ids(query, k=pool, allowed_categories=allowed_categories)
+        finally:
+            dense = dense_future.result()
+        hits = self._fuse(dense, sparse, retriever, k)
+        if self.cache is not None:
+            self.cache.put(key, generation, [(h.kind, h.ident, h.score) for h in hits])
+        return hits
+
+    def retrieve_many(
+        self,
+        queries: Sequence[str],
+        k: int = 5,
+        allowed_categories: Optional[Sequence[Optional[List[str]]]] = None,
+    ) -> List[List[HybridHit]]:
+        """``retrieve`` for a batch; ``allowed_categories`` gives one filter per query (or None for all).
+
+        Queries sharing a filter get one batched embedding call and one multi-row FAISS search;
+        BM25 runs per query on this thread meanwhile.
+        """
+        vs, retriever = self.vector_store, self.retriever
+        generation = index_generation(vs, retriever)
+        filters = list(allowed_categories) if allowed_categories is not None else [None] * len(queries)
+        out: List[Optional[List[HybridHit]]] = [None] * len(queries)
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for pos, query in enumerate(queries):
+            if self.cache is not None:
+                refs = self.cache.get(retrieval_cache_key(query, filters[pos], k), generation)
+                if refs is not None:
+                    out[pos] = self._resolve(refs, vs, retriever)
+                    if out[pos] is not None:
+                        continue
+            groups.setdefault(tuple(filters[pos] or ()), []).append(pos)
+
+        pool = k * self.candidate_factor
+        for cats, positions in groups.items():
+            cat_list = list(cats) or None
+            dense_future = self._pool.submit(vs.search_ids_batch, [queries[p] for p in positions], pool, cat_list)
+            try:
+                sparse = [retriever.retrieve_ids(queries[p], k=pool, allowed_categories=cat_list) for p in positions]
+            finally:
+                dense = dense_future.result()
+            for p, d, s in zip(positions, dense, sparse):
+                hits = self._fuse(d, s, retriever, k)
+                out[p] = hits
+                if self.cache is not None:
+                    self.cache.put(retrieval_cache_key(queries[p], filters[p], k), generation, [(h.kind, h.ident, h.score) for h in hits])
+        return [hits or [] for hits in out]
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+_GLOBAL: Optional[HybridRetriever] = None
+_GLOBAL_LOCK = threading.Lock()
+
+
+def get_hybrid_retriever() -> HybridRetriever:
+    global _GLOBAL
+    if _GLOBAL is None:
+        with _GLOBAL_LOCK:
+            if _GLOBAL is None:
+                settings = get_settings()
+                _GLOBAL = HybridRetriever(
+                    fusion=settings.hybrid_fusion,
+                    rrf_k=settings.hybrid_rrf_k,
+                    candidate_factor=settings.hybrid_candidate_factor,
+                    dense_weight=settings.hybrid_dense_weight,
+                    cache=get_retrieval_cache(),
+                    max_workers=settings.hybrid_max_workers,
+                )
+    return _GLOBAL
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from ..config import get_settings
+
+# A merged hit by reference: ('v', vector id, score) for dense hits, ('b', chunk index, score) for BM25
+# hits. References are only meaningful within the index generation they were computed for.
+HitRef = Tuple[str, int, float]
+RetrievalKey = Tuple[str, Tuple[str, ...], int]
+
+# Rough per-entry footprint: the key tuple plus one small tuple per hit
+_ENTRY_OVERHEAD = 200
+_REF_BYTES = 120
+
+
+def retrieval_cache_key(query: str, categories: Optional[Sequence[str]], k: int) -> RetrievalKey:
+    # Lowercased and whitespace-collapsed exactly like the BM25 tokenizer sees the query
+    return (' '.join(query.lower().split()), tuple(sorted(c.lower() for c in categories)) if categories else (), int(k))
+
+
+class RetrievalCache:
+    """LRU of merged top-k hit references per (query, categories, k), bounded by entries and bytes.
+
+    Storing ids instead of chunk texts keeps entries small; callers resolve them against the
+    current retriever / vector store. The whole cache is dropped when the index generation changes.
+    """
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 16 * 1024 * 1024) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self._entries: "OrderedDict[RetrievalKey, Tuple[HitRef, ...]]" = OrderedDict()
+        self._bytes = 0
+        self._generation: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _size(key: RetrievalKey, refs: Tuple[HitRef, ...]) -> int:
+        return _ENTRY_OVERHEAD + sys.getsizeof(key[0]) + _REF_BYTES * len(refs)
+
+    def _sync_generation(self, generation: Hashable) -> None:
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = generation
+
+    def get(self, key: RetrievalKey, generation: Hashable) -> Optional[List[HitRef]]:
+        with self._lock:
+            self._sync_generation(generation)
+            refs = self._entries.get(key)
+            if refs is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(refs)
+
+    def put(self, key: RetrievalKey, generation: Hashable, refs: Sequence[HitRef]) -> None:
+        frozen = tuple(refs)
+        with self._lock:
+            if self._generation is not None and generation != self._generation:
+                # Computed against an index that has been replaced meanwhile
+                return
+            self._generation = generation
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(key, old)
+            self._entries[key] = frozen
+            self._bytes += self._size(key, frozen)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                old_key, old_refs = self._entries.popitem(last=False)
+                self._bytes -= self._size(old_key, old_refs)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'approx_bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    settings = get_settings()
+    if not settings.retrieval_cache_enabled:
+        return None
+    return RetrievalCache(max_entries=settings.retrieval_cache_max_entries, max_bytes=settings.retrieval_cache_max_bytes)
@@ -1,11 +1,16 @@
 
 from __future__ import annotations
 
+import hashlib
 import os
+import threading
 from dataclasses import dataclass
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
-from rank_bm25 import BM25Okapi
+import numpy as np
+
+from .bm25 import BM25Index, count_postings
+from .snapshot import CorpusSnapshot, FileEntry, corpus_fingerprint, is_unchanged, list_corpus_files, load_snapshot, save_snapshot, snapshot_path_for
 
 
 @dataclass
@@ -16,12 +21,24 @@ class DocumentChunk:
     category: str
 
 
+@dataclass
+class _FileSegment:
+    # One corpus file's slice of the snapshot arrays, renumbered from zero
+    reused: bool
+    text: bytes
+    text_lens: np.ndarray
+    doc_ptr: np.ndarray
+    terms: np.ndarray
+    tfs: np.ndarray
+
+
 class LocalTextRetriever:
     def __init__(self, data_root: str) -> None:
         self._data_root: str = os.path.abspath(data_root)
         self._chunks: List[DocumentChunk] = []
-        self._bm25: Optional[BM25Okapi] = None
-        self._tokenized_corpus: List[List[str]] = []
+        self._bm25: Optional[BM25Index] = None
+        # Set by snapshot-backed loads; lets the vector store skip re-checking an unchanged corpus
+        self.corpus_fingerprint: Optional[str] = None
 
     @staticmethod
     def _tokenize(text: str) -> List[str]:
@@ -42,11 +59,13 @@ class LocalTextRetriever:
         top = rel.split(os.sep)[0]
         return top or 'root'
 
-    def load_directory(self, directory: str) -> int:
+    def load_directory(self, directory: str, snapshot_path: Optional[str] = None) -> int:
         directory = os.path.abspath(directory)
         count = 0
         if not os.path.exists(directory):
             return 0
+        if snapshot_path is not None:
+            return self._load_with_snapshot(directory, snapshot_path)
         for root, _dirs, files in os.walk(directory):
             for fname in files:
                 if not fname.lower().endswith(('.txt', '.md')):
@@ -60,45 +79,151 @@ class LocalTextRetriever:
                     chunk_id = f"{fname}-{idx}"
                     self._chunks.append(DocumentChunk(text=para, source=fpath, chunk_id=chunk_id, category=category))
                     count += 1
-        self._tokenized_corpus = [self._tokenize(c.text) for c in self._chunks]
-        if self._tokenized_corpus:
-            self._bm25 = BM25Okapi(self._tokenized_corpus)
+        if self._chunks:
+            # Tokens are interned into the index vocabulary; the per-chunk token lists are not kept
+            self._bm25 = BM25Index.build((self._tokenize(c.text) for c in self._chunks), [c.category for c in self._chunks])
         return count
 
-    def retrieve(self, query: str, k: int = 5, allowed_categories: Optional[List[str]] = None) -> List[Tuple[DocumentChunk, float]]:
-        if self._bm25 is None or not self._tokenized_corpus:
+    def _load_with_snapshot(self, directory: str, snapshot_path: str) -> int:
+        """Load ``directory`` (replacing any loaded chunks), reusing the persisted snapshot.
+
+        Files whose fingerprint matches the snapshot keep their chunks and BM25 postings as stored;
+        only new or changed files are read and tokenized. The snapshot is rewritten when anything
+        changed.
+        """
+        prev = load_snapshot(snapshot_path)
+        old_files = prev.files if prev is not None else {}
+        fresh_vocab: Dict[str, int] = {}
+        files: Dict[str, FileEntry] = {}
+        chunks: List[DocumentChunk] = []
+        segments: List[_FileSegment] = []
+        changed = False
+        for fpath in list_corpus_files(directory):
+            rel = os.path.relpath(fpath, directory)
+            st = os.stat(fpath)
+            fname = os.path.basename(fpath)
+            category = self._infer_category(fpath)
+            entry = old_files.get(rel)
+            if prev is not None and is_unchanged(entry, fpath, st):
+                lo, hi = entry.doc_start, entry.doc_start + entry.doc_count
+                texts = [prev.chunk_text(d) for d in range(lo, hi)]
+                p0, p1 = int(prev.doc_ptr[lo]), int(prev.doc_ptr[hi])
+                segments.append(_FileSegment(
+                    reused=True, text=prev.text[prev.text_off[lo]:prev.text_off[hi]].tobytes(),
+                    text_lens=np.diff(prev.text_off[lo:hi + 1]), doc_ptr=prev.doc_ptr[lo:hi + 1] - p0,
+                    terms=prev.terms[p0:p1], tfs=prev.tfs[p0:p1],
+                ))
+                sha1 = entry.sha1
+                changed = changed or entry.mtime_ns != st.st_mtime_ns
+            else:
+                with open(fpath, 'rb') as f:
+                    sha1 = hashlib.sha1(f.read()).hexdigest()
+                with open(fpath, 'r', encoding='utf-8', errors='ignore') as f:
+                    texts = self._split_into_paragraphs(f.read())
+                encoded = [t.encode('utf-8') for t in texts]
+                doc_ptr, terms, tfs = count_postings((self._tokenize(t) for t in texts), fresh_vocab)
+                segments.append(_FileSegment(
+                    reused=False, text=b''.join(encoded), text_lens=np.asarray([len(e) for e in encoded], dtype='int64'),
+                    doc_ptr=doc_ptr, terms=terms, tfs=tfs,
+                ))
+                changed = True
+            files[rel] = FileEntry(
+                path=rel, size=st.st_size, mtime_ns=st.st_mtime_ns, sha1=sha1, doc_start=len(chunks), doc_count=len(texts),
+            )
+            for idx, text in enumerate(texts):
+                chunks.append(DocumentChunk(text=text, source=fpath, chunk_id=f"{fname}-{idx}", category=category))
+        changed = changed or set(files) != set(old_files)
+
+        # Merge vocabularies: stored term ids still in use first, then terms of re-tokenized files
+        old_vocab = prev.vocab if prev is not None else []
+        reused_terms = [seg.terms for seg in segments if seg.reused]
+        used_old = np.unique(np.concatenate(reused_terms)) if reused_terms else np.zeros(0, dtype='int32')
+        vocab: Dict[str, int] = {old_vocab[int(i)]: n for n, i in enumerate(used_old)}
+        old_map = np.full(len(old_vocab), -1, dtype='int32')
+        old_map[used_old] = np.arange(used_old.shape[0], dtype='int32')
+        for tok in fresh_vocab:
+            vocab.setdefault(tok, len(vocab))
+        fresh_map = np.fromiter((vocab[tok] for tok in fresh_vocab), dtype='int32', count=len(fresh_vocab))
+
+        doc_ptr = np.zeros(len(chunks) + 1, dtype='int64')
+        text_off = np.zeros(len(chunks) + 1, dtype='int64')
+        terms = np.zeros(0, dtype='int32')
+        tfs = np.zeros(0, dtype='int32')
+        if segments:
+            if chunks:
+                np.cumsum(np.concatenate([np.diff(seg.doc_ptr) for seg in segments]), out=doc_ptr[1:])
+                np.cumsum(np.concatenate([seg.text_lens for seg in segments]), out=text_off[1:])
+            terms = np.concatenate([(old_map if seg.reused else fresh_map)[seg.terms] for seg in segments]).astype('int32')
+            tfs = np.concatenate([seg.tfs for seg in segments]).astype('int32')
+
+        self._chunks = chunks
+        self.corpus_fingerprint = corpus_fingerprint(directory, files)
+        self._bm25 = BM25Index.from_postings(vocab, doc_ptr, terms, tfs, [c.category for c in chunks]) if chunks else None
+        if changed or prev is None:
+            save_snapshot(snapshot_path, CorpusSnapshot(
+                files=files,
+                vocab=list(vocab),
+                text=np.frombuffer(b''.join(seg.text for seg in segments), dtype='uint8'),
+                text_off=text_off,
+                doc_ptr=doc_ptr,
+                terms=terms,
+                tfs=tfs,
+            ))
+        return len(chunks)
+
+    def retrieve_ids(self, query: str, k: int = 5, allowed_categories: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """(chunk index, score) pairs; indexes are positions in this retriever's chunk table."""
+        if self._bm25 is None:
             return []
-        q_tokens = self._tokenize(query)
-        scores = self._bm25.get_scores(q_tokens)
-        idx_scores = list(enumerate(scores))
-        # Optional category filtering
-        if allowed_categories:
-            allowed_set = set(a.lower() for a in allowed_categories)
-            idx_scores = [(i, s) for i, s in idx_scores if self._chunks[i].category.lower() in allowed_set]
-            if not idx_scores:
-                # fallback to global if none matched
-                idx_scores = list(enumerate(scores))
-        idx_scores.sort(key=lambda x: x[1], reverse=True)
-        idx_scores = idx_scores[:k]
-        return [(self._chunks[i], float(s)) for i, s in idx_scores if s > 0]
+        # Category filtering uses the index's per-category masks (falls back to global if none matched)
+        return self._bm25.top_k(self._tokenize(query), k=k, allowed_categories=allowed_categories)
+
+    def tokenize(self, text: str) -> List[str]:
+        """The tokenizer the BM25 index was built with."""
+        return self._tokenize(text)
+
+    def query_term_weights(self, query: str) -> Dict[str, float]:
+        """idf of each query token known to the BM25 index, times its multiplicity in the query."""
+        if self._bm25 is None:
+            return {}
+        weights: Dict[str, float] = {}
+        for tok in self._tokenize(query):
+            tid = self._bm25.vocab.get(tok)
+            if tid is not None:
+                weights[tok] = weights.get(tok, 0.0) + float(self._bm25.idf[tid])
+        return weights
+
+    def chunk(self, index: int) -> DocumentChunk:
+        return self._chunks[index]
+
+    def retrieve(self, query: str, k: int = 5, allowed_categories: Optional[List[str]] = None) -> List[Tuple[DocumentChunk, float]]:
+        return [(self._chunks[i], s) for i, s in self.retrieve_ids(query, k=k, allowed_categories=allowed_categories)]
+
 
+# Corpus of converted/uploaded texts; one directory per category
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
 
 # Global singleton retriever stored on module for simplicity
 _GLOBAL: Optional[LocalTextRetriever] = None
+# Serializes builds so a request arriving during startup waits for the build in progress instead of starting another
+_BUILD_LOCK = threading.RLock()
 
 
-def build_global_retriever(data_dir: str | None = None) -> LocalTextRetriever:
+def build_global_retriever(data_dir: str | None = None, use_snapshot: bool = True) -> LocalTextRetriever:
     global _GLOBAL
-    if data_dir is None:
-        data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+    data_dir = os.path.abspath(data_dir or DATA_DIR)
     os.makedirs(data_dir, exist_ok=True)
-    retriever = LocalTextRetriever(data_root=data_dir)
-    retriever.load_directory(data_dir)
-    _GLOBAL = retriever
+    with _BUILD_LOCK:
+        retriever = LocalTextRetriever(data_root=data_dir)
+        # The persisted snapshot (app_data/retriever) makes this re-tokenize only new/changed files
+        retriever.load_directory(data_dir, snapshot_path=snapshot_path_for(data_dir) if use_snapshot else None)
+        _GLOBAL = retriever
     return retriever
 
 
 def get_retriever() -> LocalTextRetriever:
     if _GLOBAL is None:
-        return build_global_retriever()
+        with _BUILD_LOCK:
+            if _GLOBAL is None:
+                return build_global_retriever()
     return _GLOBAL
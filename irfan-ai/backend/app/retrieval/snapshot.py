@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SNAPSHOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app_data', 'retriever'))
+
+# Bump when tokenization / paragraph splitting changes so stale snapshots are rebuilt
+_FORMAT = 1
+
+
+@dataclass
+class FileEntry:
+    path: str  # relative to the corpus directory
+    size: int
+    mtime_ns: int
+    sha1: str
+    doc_start: int
+    doc_count: int
+
+
+@dataclass
+class CorpusSnapshot:
+    """Chunk table and BM25 postings of a corpus directory, plus a fingerprint of its files.
+
+    Chunk ``i`` has UTF-8 text ``text[text_off[i]:text_off[i + 1]]`` and doc-major postings
+    ``terms[doc_ptr[i]:doc_ptr[i + 1]]`` / ``tfs[...]`` whose term ids index ``vocab``. Each file
+    covers the contiguous chunk range ``[doc_start, doc_start + doc_count)``.
+    """
+
+    files: Dict[str, FileEntry]
+    vocab: List[str]
+    text: np.ndarray
+    text_off: np.ndarray
+    doc_ptr: np.ndarray
+    terms: np.ndarray
+    tfs: np.ndarray
+
+    def chunk_text(self, doc: int) -> str:
+        return self.text_bytes(doc).decode('utf-8')
+
+    def text_bytes(self, doc: int) -> bytes:
+        return self.text[self.text_off[doc]:self.text_off[doc + 1]].tobytes()
+
+
+def snapshot_path_for(directory: str, root: Optional[str] = None) -> str:
+    key = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(root or SNAPSHOT_DIR, f'corpus-{key}.npz')
+
+
+def corpus_fingerprint(directory: str, files: Dict[str, FileEntry]) -> str:
+    """Digest of the corpus content; equal fingerprints mean identical chunks, sources and categories."""
+    h = hashlib.sha1(f'{_FORMAT}\x00{os.path.abspath(directory)}'.encode('utf-8'))
+    for rel in sorted(files):
+        h.update(f'\x00{rel}\x00{files[rel].sha1}'.encode('utf-8'))
+    return h.hexdigest()
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def list_corpus_files(directory: str) -> List[str]:
+    # Sorted, so chunk order (and BM25 tie-breaking) does not depend on directory listing order
+    out: List[str] = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        out.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(('.txt', '.md')))
+    return out
+
+
+def is_unchanged(entry: Optional[FileEntry], path: str, st: os.stat_result) -> bool:
+    """Whether ``path`` still has the content recorded in ``entry``.
+
+    Size and mtime are trusted when both match; otherwise the content hash decides, so touched
+    or copied-but-identical files are not re-tokenized.
+    """
+    if entry is None:
+        return False
+    if entry.size == st.st_size and entry.mtime_ns == st.st_mtime_ns:
+        return True
+    if entry.size != st.st_size:
+        return False
+    return file_sha1(path) == entry.sha1
+
+
+def load_snapshot(path: str) -> Optional[CorpusSnapshot]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(data['header'].tobytes().decode('utf-8'))
+            if header.get('format') != _FORMAT:
+                return None
+            return CorpusSnapshot(
+                files={e['path']: FileEntry(**e) for e in header['files']},
+                vocab=json.loads(data['vocab'].tobytes().decode('utf-8')),
+                text=data['text'],
+                text_off=data['text_off'],
+                doc_ptr=data['doc_ptr'],
+                terms=data['terms'],
+                tfs=data['tfs'],
+            )
+    except (OSError, ValueError, KeyError, TypeError):
+        # Corrupt or foreign file: treat as missing and rebuild
+        return None
+
+
+def save_snapshot(path: str, snap: CorpusSnapshot) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = {'format': _FORMAT, 'files': [asdict(e) for e in snap.files.values()]}
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(
+            f,
+            header=np.frombuffer(json.dumps(header, ensure_ascii=False).encode('utf-8'), dtype='uint8'),
+            vocab=np.frombuffer(json.dumps(snap.vocab, ensure_ascii=False).encode('utf-8'), dtype='uint8'),
+            text=snap.text,
+            text_off=snap.text_off,
+            doc_ptr=snap.doc_ptr,
+            terms=snap.terms,
+            tfs=snap.tfs,
+        )
+    # Workers sharing app_data may race here; the last complete snapshot wins
+    os.replace(tmp, path)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, List
+
+import numpy as np
+
+# Sentence ends (Latin and Arabic punctuation) or line breaks
+_SENTENCE_END = re.compile(r'(?<=[.!?؟۔…])\s+|\s*\n+\s*')
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in (p.strip() for p in _SENTENCE_END.split(text)) if s]
+
+
+def extract_snippet(
+    text: str,
+    term_weights: Dict[str, float],
+    tokenize: Callable[[str], List[str]],
+    window: int = 3,
+    max_windows: int = 2,
+    min_chars: int = 600,
+    k1: float = 1.2,
+    b: float = 0.75,
+) -> str:
+    """The query-relevant part of ``text``: its best ``max_windows`` windows of ``window`` sentences.
+
+    Sentences are scored BM25-style against the query, with ``term_weights`` (token -> idf, as seen
+    by the corpus index) and sentence length normalized within this text. Chosen windows do not
+    overlap, stay in document order and are joined with `` … ``. Texts shorter than ``min_chars``,
+    or without a single matching sentence, are returned unchanged.
+    """
+    if len(text) <= min_chars or not term_weights:
+        return text
+    sentences = split_sentences(text)
+    if len(sentences) <= window:
+        return text
+    terms = list(term_weights)
+    col = {t: j for j, t in enumerate(terms)}
+    tf = np.zeros((len(sentences), len(terms)), dtype='float32')
+    lengths = np.empty(len(sentences), dtype='float32')
+    for i, sentence in enumerate(sentences):
+        tokens = tokenize(sentence)
+        lengths[i] = len(tokens)
+        for tok in tokens:
+            j = col.get(tok)
+            if j is not None:
+                tf[i, j] += 1.0
+    if not tf.any():
+        return text
+    norm = k1 * (1.0 - b + b * lengths / max(float(lengths.mean()), 1.0))
+    weights = np.array([term_weights[t] for t in terms], dtype='float32')
+    scores = ((tf * (k1 + 1.0)) / (tf + norm[:, None])) @ weights
+
+    # Window score = sum of its sentence scores; pick the best non-overlapping windows greedily
+    win = min(window, len(sentences))
+    win_scores = np.convolve(scores, np.ones(win, dtype='float32'), mode='valid')
+    taken = np.zeros(len(sentences), dtype=bool)
+    starts: List[int] = []
+    for start in np.argsort(-win_scores, kind='stable'):
+        if len(starts) >= max_windows or win_scores[start] <= 0:
+            break
+        if taken[start:start + win].any():
+            continue
+        taken[start:start + win] = True
+        starts.append(int(start))
+    if not starts:
+        return text
+    starts.sort()
+    parts: List[str] = []
+    for n, start in enumerate(starts):
+        piece = ' '.join(sentences[start:start + win])
+        # Adjacent windows read as one passage
+        if n and starts[n - 1] + win == start:
+            parts[-1] = parts[-1] + ' ' + piece
+        else:
+            parts.append(piece)
+    snippet = ' … '.join(parts)
+    if starts[0] > 0:
+        snippet = '… ' + snippet
+    if starts[-1] + win < len(sentences):
+        snippet = snippet + ' …'
+    return snippet
@@ -1,30 +1,41 @@
 
 from __future__ import annotations
 
-import json
+import asyncio
 import os
 import re
 import uuid
-from datetime import datetime
-from typing import Any, Dict, Generator, List, Optional
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy as np
 
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from openai import APIStatusError, OpenAI
+from openai import APIStatusError
 
 from ..config import get_settings
 from ..db import get_session
+from ..llm import get_llm_client
+from ..message_store import ensure_session, flush_all, invalidate_history, load_recent_messages, save_message
 from ..models import ChatSession, Message
+from ..retrieval.hybrid import HybridHit, get_hybrid_retriever, index_generation
 from ..retrieval.retriever import get_retriever
-from ..rag.vector_store import FaissVectorStore
-from ..schemas import ChatRequest, ChatResponse
+from ..retrieval.snippets import extract_snippet
+from ..rag.answer_cache import AnswerKey, get_answer_cache, make_answer_key
+from ..rag.embeddings import embed_queries, embed_query
+from ..rag.prompt_budget import clamp_max_tokens, count_message_tokens, fit_prompt, prompt_counter
+from ..schemas import BatchChatRequest, BatchChatResult, ChatRequest, ChatResponse
 from ..utils.guardrails import (
     SYSTEM_POLICY_PROMPT,
-    has_prompt_injection,
-    is_in_allowed_domain,
-    _normalize_for_matching,
+    GuardrailVerdict,
+    classify_query,
+    MarkdownStreamCleaner,
     clean_markdown_formatting,
 )
+from ..utils.sse import SSEEncoder, coalesce, dumps
 
 router = APIRouter(tags=["chat"])
 
@@ -42,18 +53,16 @@ def _ensure_session(session_id: str | None, user_id: str | None = None, title: s
     Eğer kullanıcının 30'dan fazla session'ı varsa en eskisini sil.
     """
     if session_id:
-        with get_session() as db:
-            sess = db.get(ChatSession, session_id)
-            if sess is None:
-                # Session yoksa yeni oluştur (demo mode için)
-                db.add(ChatSession(id=session_id, user_id=user_id, title=title))
-                db.commit()
+        # Session yoksa yeni oluştur (demo mode için); yazma kuyruğa alınır, yazıcı yoksa ekler
+        ensure_session(session_id, user_id=user_id, title=title)
         return session_id
     
     new_id = str(uuid.uuid4())
-    with get_session() as db:
-        # Kullanıcının toplam session sayısını kontrol et
-        if user_id:
+    if user_id:
+        # Sayım kuyrukta bekleyen oturumları da görmeli
+        flush_all()
+        with get_session() as db:
+            # Kullanıcının toplam session sayısını kontrol et
             user_sessions = db.query(ChatSession).filter(ChatSession.user_id == user_id).order_by(ChatSession.created_at.asc()).all()
             # 30 limitini aştıysa en eskiyi sil
             if len(user_sessions) >= 30:
@@ -62,49 +71,26 @@ def _ensure_session(session_id: str | None, user_id: str | None = None, title: s
                 db.query(Message).filter(Message.session_id == oldest_session.id).delete()
                 db.delete(oldest_session)
                 db.commit()
+                invalidate_history(oldest_session.id)
         
-        # Yeni session oluştur
-        db.add(ChatSession(id=new_id, user_id=user_id, title=title))
-        db.commit()
+    # Yeni session oluştur (geçmişi boş olarak önbelleğe alınır)
+    ensure_session(new_id, user_id=user_id, title=title, new=True)
     return new_id
 
 
 def _save_message(session_id: str, role: str, content: str) -> None:
-    with get_session() as db:
-        db.add(Message(session_id=session_id, role=role, content=content))
-        chat = db.get(ChatSession, session_id)
-        if chat:
-            chat.updated_at = datetime.utcnow()
-        db.commit()
+    # Write-behind: tek yazıcı thread toplu transaction ile kaydeder (updated_at da orada güncellenir)
+    save_message(session_id, role, content)
 
 
 def _load_recent_messages(session_id: str, limit: int = 12) -> List[Dict[str, str]]:
-    with get_session() as db:
-        rows = (
-            db.query(Message)
-            .filter(Message.session_id == session_id)
-            .order_by(Message.created_at.asc())
-            .all()
-        )
-    messages = [{"role": m.role, "content": m.content} for m in rows][-limit:]
-    return messages
+    # Önce worker'ın oturum geçmişi önbelleği; yoksa son N mesaj (session_id, created_at, id) indeksinden okunur
+    return load_recent_messages(session_id, limit=limit)
 
 
-def _select_categories(query: str) -> Optional[List[str]]:
-    # Heuristik sınıflandırma: normalize et ve anahtar kelimelerle kategori belirle
-    norm = _normalize_for_matching(query)
-    gizli_markers = [
-        "gizli ilimler hazinesi", "mustafa iloglu", "havas", "ruhaniyat", "vird"
-    ]
-    if any(m in norm for m in gizli_markers):
-        return DOMAIN_CATS["gizli"]
-    hadis_markers = ["hadis", "bukhari", "muslim", "rivayet"]
-    if any(m in norm for m in hadis_markers):
-        return DOMAIN_CATS["hadis"]
-    kuran_markers = ["kuran", "ayet", "sure", "tefsir", "fatiha", "bakara", "nisa", "yasin"]
-    if any(m in norm for m in kuran_markers):
-        return DOMAIN_CATS["kuran"]
-    return None
+def _categories_for(verdict: GuardrailVerdict) -> Optional[List[str]]:
+    # Kategori işaretleri guardrails.CATEGORY_MARKERS'ta; sınıflandırıcı ilk eşleşen grubu verir
+    return DOMAIN_CATS[verdict.category] if verdict.category else None
 
 
 def _language_system_prompt(lang: str) -> str:
@@ -126,134 +112,415 @@ def _language_system_prompt(lang: str) -> str:
     )
 
 
-@router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest) -> Any:
-    settings = get_settings()
-    # Session title için sorgunun ilk 50 karakterini kullan
-    title = req.query[:50] if not req.session_id else None
-    session_id = _ensure_session(req.session_id, user_id=req.user_id, title=title)
+@dataclass
+class _PreparedChat:
+    session_id: str
+    lang: str
+    messages: List[Dict[str, str]]
+    citations: List[str]
+    # Cevap önbelleği: isabet varsa cached dolu gelir, LLM çağrılmaz
+    cached: Optional[str] = None
+    cache_key: Optional[AnswerKey] = None
+    generation: Optional[Hashable] = None
+    query_embedding: Optional[np.ndarray] = None
+    prompt_tokens: Optional[int] = None
 
-    user_text = req.query.strip()
 
-    if has_prompt_injection(user_text):
-        refusal = (
-            "Güvenlik: Prompt injection tespit edildi. Lütfen talebinizi daha doğal bir dille,"
-            " kapsam dahilindeki kaynaklarla ilgili olacak şekilde tekrar ifade ediniz."
-        )
-        _save_message(session_id, "user", user_text)
-        _save_message(session_id, "assistant", refusal)
-        return ChatResponse(session_id=session_id, content=refusal, citations=[], language=req.language)
+def _index_generation() -> Hashable:
+    # Cevap ve retrieval önbellekleri bu değere bağlı: indeks yeniden kurulunca boşaltılır
+    return index_generation()
 
-    if not is_in_allowed_domain(user_text):
-        refusal = (
-            "Bu asistan yalnızca Kur'ân, sahih hadis ve Mustafa İloğlu'nun Gizli İlimler Hazinesi kapsamındaki"
-            " havas ilimleri hakkında yardımcı olabilir. Lütfen soruyu bu kapsamda tekrar ifade ediniz."
-        )
-        _save_message(session_id, "user", user_text)
-        _save_message(session_id, "assistant", refusal)
-        return ChatResponse(session_id=session_id, content=refusal, citations=[], language=req.language)
 
-    # Retrieval
+_INJECTION_REFUSAL = (
+    "Güvenlik: Prompt injection tespit edildi. Lütfen talebinizi daha doğal bir dille,"
+    " kapsam dahilindeki kaynaklarla ilgili olacak şekilde tekrar ifade ediniz."
+)
+_DOMAIN_REFUSAL = (
+    "Bu asistan yalnızca Kur'ân, sahih hadis ve Mustafa İloğlu'nun Gizli İlimler Hazinesi kapsamındaki"
+    " havas ilimleri hakkında yardımcı olabilir. Lütfen soruyu bu kapsamda tekrar ifade ediniz."
+)
+
+
+def _guardrail_refusal(verdict: GuardrailVerdict) -> Optional[str]:
+    if verdict.injection:
+        return _INJECTION_REFUSAL
+    if not verdict.allowed:
+        return _DOMAIN_REFUSAL
+    return None
+
+
+def _llm_error_message(e: Exception) -> str:
+    return (
+        "Model cevabı alınamadı. Lütfen HF_TOKEN ayarınızı ve ağ bağlantınızı kontrol ediniz. "
+        f"Hata: {e}"
+    )
+
+
+def _context_texts(hits: List[HybridHit], user_text: str) -> List[str]:
+    # Uzun parçalardan yalnızca soruyla en ilgili cümle pencereleri gönderilir (BM25 idf ile puanlanır)
+    settings = get_settings()
+    if not settings.snippet_enabled:
+        return [hit.doc.text for hit in hits]
     retriever = get_retriever()
-    allowed_categories = _select_categories(user_text)
-    vs = FaissVectorStore(index_dir=os.path.join(os.path.dirname(__file__), "..", "app_data", "faiss"))
-    vhits = vs.search(user_text, k=5, allowed_categories=allowed_categories)
-    v_as_chunks = []
-    for m, sc in vhits:
-        class M: pass
-        mc = M(); mc.text=m.text; mc.source=m.source; mc.chunk_id=m.chunk_id
-        v_as_chunks.append((mc, sc))
-    bm_hits = retriever.retrieve(user_text, k=5, allowed_categories=allowed_categories)
-    seen=set(); hits=[]
-    for pair in v_as_chunks + bm_hits:
-        key=(pair[0].source, pair[0].chunk_id)
-        if key in seen: continue
-        seen.add(key); hits.append(pair)
-    hits = hits[:5]
-    citations: List[str] = []
-    context_blocks: List[str] = []
-    for doc, score in hits:
-        citations.append(f"{doc.source}#{doc.chunk_id}")
-        context_blocks.append(f"[Kaynak] {os.path.basename(doc.source)} ({doc.chunk_id})\n{doc.text}")
-
-    context_text = "\n\n".join(context_blocks)
+    weights = retriever.query_term_weights(user_text)
+    return [
+        extract_snippet(
+            hit.doc.text, weights, retriever.tokenize,
+            window=settings.snippet_window, max_windows=settings.snippet_max_windows, min_chars=settings.snippet_min_chars,
+        )
+        for hit in hits
+    ]
+
+
+def _build_messages(
+    lang: str, hits: List[HybridHit], user_text: str, history: List[Dict[str, str]]
+) -> Tuple[List[Dict[str, str]], List[str], int]:
+    # Bağlam ve geçmiş token bütçesine sığdırılır: düşük sıralı bloklar ve en eski turlar önce düşer
+    settings = get_settings()
+    count = prompt_counter()
+    language_prompt = _language_system_prompt(lang)
+    blocks = [
+        f"[Kaynak] {os.path.basename(hit.doc.source)} ({hit.doc.chunk_id})\n{text}"
+        for hit, text in zip(hits, _context_texts(hits, user_text))
+    ]
+    fitted = fit_prompt(
+        [SYSTEM_POLICY_PROMPT, language_prompt, user_text],
+        blocks,
+        [m for m in history if m["role"] in ("user", "assistant")],
+        settings.prompt_budget_tokens,
+        context_share=settings.prompt_context_share,
+        min_block_tokens=settings.prompt_min_block_tokens,
+        count=count,
+    )
+    # Yalnızca prompt'a giren bloklar kaynak olarak gösterilir
+    citations = [f"{hits[i].doc.source}#{hits[i].doc.chunk_id}" for i in fitted.block_ids]
+
+    context_text = "\n\n".join(fitted.blocks)
 
     # Build messages
     messages: List[Dict[str, str]] = []
     messages.append({"role": "system", "content": SYSTEM_POLICY_PROMPT})
 
-    # Dil talimatı: auto -> tr varsayılan
-    lang = req.language if req.language != "auto" else "tr"
-    messages.append({"role": "system", "content": _language_system_prompt(lang)})
+    messages.append({"role": "system", "content": language_prompt})
 
     if context_text:
         messages.append({"role": "system", "content": f"BAĞLAM:\n{context_text}"})
 
-    history_messages = _load_recent_messages(session_id)
-    for m in history_messages:
-        if m["role"] in ("user", "assistant"):
-            messages.append(m)
+    messages.extend(fitted.history)
 
     messages.append({"role": "user", "content": user_text})
+    return messages, citations, count_message_tokens(messages, count)
+
+
+def _cache_answer(prepared: _PreparedChat, content: str, finish_reason: Optional[str]) -> None:
+    # Yalnızca tamamlanmış cevaplar saklanır: token sınırında kesilen ("length") ya da yarıda kalan cevap önbelleğe girmez
+    cache = get_answer_cache()
+    if cache is not None and prepared.cache_key is not None and finish_reason == "stop":
+        cache.put(prepared.cache_key, prepared.generation, content, prepared.citations, embedding=prepared.query_embedding)
+
+
+def _prepare_chat(req: ChatRequest) -> Union[ChatResponse, _PreparedChat]:
+    # Bloklayan adımlar (DB, guardrails, retrieval) tek seferde threadpool'da çalışır
+    settings = get_settings()
+    # Session title için sorgunun ilk 50 karakterini kullan
+    title = req.query[:50] if not req.session_id else None
+    session_id = _ensure_session(req.session_id, user_id=req.user_id, title=title)
+
+    user_text = req.query.strip()
+
+    # Tek geçişte normalize + injection/domain/kategori sınıflandırması
+    verdict = classify_query(user_text)
+    refusal = _guardrail_refusal(verdict)
+    if refusal is not None:
+        _save_message(session_id, "user", user_text)
+        _save_message(session_id, "assistant", refusal)
+        return ChatResponse(session_id=session_id, content=refusal, citations=[], language=req.language)
+
+    allowed_categories = _categories_for(verdict)
+    # Dil talimatı: auto -> tr varsayılan
+    lang = req.language if req.language != "auto" else "tr"
+
+    history = _load_recent_messages(session_id)
+    cache = get_answer_cache()
+    cache_key = generation = q_emb = None
+    # Önbellekteki cevaplar geçmişsiz üretilir: yalnızca sohbetin ilk sorusunda okunur/yazılır
+    if cache is not None and not history:
+        cache_key = make_answer_key(verdict.normalized, lang, allowed_categories, req.max_tokens, req.temperature, req.top_p)
+        generation = _index_generation()
+        hit = cache.get_exact(cache_key, generation)
+        if hit is None:
+            # Embedding yalnızca tam eşleşme yoksa ve anlamsal katman açıksa hesaplanır;
+            # sorgu vektörü LRU'da kalır, aşağıdaki vektör aramada tekrar hesaplanmaz
+            q_emb = embed_query(user_text) if cache.semantic_threshold is not None else None
+            hit = cache.get(cache_key, generation, embedding=q_emb)
+        if hit is not None:
+            _save_message(session_id, "user", user_text)
+            _save_message(session_id, "assistant", hit.content)
+            return _PreparedChat(session_id=session_id, lang=lang, messages=[], citations=list(hit.citations), cached=hit.content)
+
+    # Retrieval
+    # Vektör + BM25 paralel aranır, RRF ile birleştirilir (aynı sorgu için id listesi önbellekten gelir)
+    hits = get_hybrid_retriever().retrieve(user_text, k=settings.retrieval_k, allowed_categories=allowed_categories)
+    messages, citations, prompt_tokens = _build_messages(lang, hits, user_text, history)
 
     _save_message(session_id, "user", user_text)
+    return _PreparedChat(
+        session_id=session_id, lang=lang, messages=messages, citations=citations,
+        cache_key=cache_key, generation=generation, query_embedding=q_emb, prompt_tokens=prompt_tokens,
+    )
+
 
-    client = OpenAI(base_url=settings.hf_api_base, api_key=settings.hf_token)
+_SSE_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest) -> Any:
+    settings = get_settings()
+    prepared = await run_in_threadpool(_prepare_chat, req)
+    if isinstance(prepared, ChatResponse):
+        return prepared
+    session_id, lang, messages, citations = prepared.session_id, prepared.lang, prepared.messages, prepared.citations
+
+    if prepared.cached is not None:
+        if req.stream:
+            encoder = SSEEncoder(req.stream_format)
+
+            async def cached_stream() -> AsyncGenerator[bytes, None]:
+                yield encoder.token(prepared.cached or "")
+                yield encoder.done(session_id, citations)
+            return StreamingResponse(cached_stream(), headers=_SSE_HEADERS)
+        return ChatResponse(session_id=session_id, content=prepared.cached, citations=citations, language=lang)
+
+    # Uygulama genelinde paylaşılan async istemci: LLM beklerken thread tutulmaz
+    client = get_llm_client()
+    # Prompt + cevap modelin bağlam penceresini aşmasın
+    max_tokens = clamp_max_tokens(req.max_tokens, prepared.prompt_tokens or 0)
 
     if req.stream:
-        def token_stream() -> Generator[bytes, None, None]:
+        encoder = SSEEncoder(req.stream_format)
+
+        # Akışın bitiş nedeni: "stop" gelmeden biten akış tamamlanmamış sayılır
+        finish: Dict[str, Optional[str]] = {"reason": None}
+
+        async def deltas(stream: Any) -> AsyncGenerator[str, None]:
+            async for chunk in stream:
+                # Boş choices kontrolü
+                if not chunk.choices or len(chunk.choices) == 0:
+                    continue
+                reason = getattr(chunk.choices[0], "finish_reason", None)
+                if reason:
+                    finish["reason"] = reason
+                delta = getattr(chunk.choices[0].delta, "content", None)
+                if delta:
+                    yield delta
+
+        async def cleaned(stream: Any) -> AsyncGenerator[str, None]:
+            # Markdown akış sırasında temizlenir: istemciye giden metin kaydedilen cevapla aynıdır
+            cleaner = MarkdownStreamCleaner(settings.markdown_stream_buffer_chars)
+            async for delta in deltas(stream):
+                text = cleaner.feed(delta)
+                if text:
+                    yield text
+            tail = cleaner.finish()
+            if tail:
+                yield tail
+
+        async def token_stream() -> AsyncGenerator[bytes, None]:
+            stream = None
             try:
-                stream = client.chat.completions.create(
+                stream = await client.chat.completions.create(
                     model=settings.model,
                     messages=messages,
                     temperature=req.temperature,
                     top_p=req.top_p,
-                    max_tokens=req.max_tokens,
+                    max_tokens=max_tokens,
                     stream=True,
                 )
                 accumulated: List[str] = []
-                for chunk in stream:
-                    # Boş choices kontrolü
-                    if not chunk.choices or len(chunk.choices) == 0:
-                        continue
-                    delta = getattr(chunk.choices[0].delta, "content", None)
-                    if delta:
-                        accumulated.append(delta)
-                        payload = {"token": delta, "done": False}
-                        yield (f"data: {json.dumps(payload, ensure_ascii=False)}\n\n").encode("utf-8")
+                # Küçük delta'lar zaman/boyut bütçesiyle tek frame'de birleştirilir
+                frames = coalesce(cleaned(stream), settings.sse_flush_interval_ms / 1000.0, settings.sse_flush_max_chars)
+                async with aclosing(frames):
+                    async for text in frames:
+                        accumulated.append(text)
+                        yield encoder.token(text)
                 final_text = "".join(accumulated)
-                # Markdown formatlarını temizle
-                final_text = clean_markdown_formatting(final_text)
-                _save_message(session_id, "assistant", final_text)
-                done_payload = {"token": "", "done": True, "session_id": session_id, "citations": citations}
-                yield (f"data: {json.dumps(done_payload, ensure_ascii=False)}\n\n").encode("utf-8")
+                await run_in_threadpool(_save_message, session_id, "assistant", final_text)
+                _cache_answer(prepared, final_text, finish["reason"])
+                yield encoder.done(session_id, citations)
             except APIStatusError as e:
-                err_payload = {"error": str(e)}
-                yield (f"data: {json.dumps(err_payload, ensure_ascii=False)}\n\n").encode("utf-8")
-        headers = {
-            "Content-Type": "text/event-stream",
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        }
-        return StreamingResponse(token_stream(), headers=headers)
+                yield encoder.error(str(e))
+            finally:
+                # İstemci bağlantıyı koparırsa upstream yanıtı da kapat, bağlantı havuza dönsün
+                if stream is not None:
+                    await stream.close()
+        return StreamingResponse(token_stream(), headers={**_SSE_HEADERS, "X-Prompt-Tokens": str(prepared.prompt_tokens)})
 
     try:
-        comp = client.chat.completions.create(
+        comp = await client.chat.completions.create(
             model=settings.model,
             messages=messages,
             temperature=req.temperature,
             top_p=req.top_p,
-            max_tokens=req.max_tokens,
+            max_tokens=max_tokens,
             stream=False,
         )
         content = comp.choices[0].message.content or ""
         # Markdown formatlarını temizle
         content = clean_markdown_formatting(content)
+        _cache_answer(prepared, content, comp.choices[0].finish_reason)
     except Exception as e:  # noqa: BLE001
-        content = (
-            "Model cevabı alınamadı. Lütfen HF_TOKEN ayarınızı ve ağ bağlantınızı kontrol ediniz. "
-            f"Hata: {e}"
+        content = _llm_error_message(e)
+    await run_in_threadpool(_save_message, session_id, "assistant", content)
+    return ChatResponse(session_id=session_id, content=content, citations=citations, language=lang, prompt_tokens=prepared.prompt_tokens)
+
+
+@dataclass
+class _BatchJob:
+    # Aynı sorunun tüm tekrarları tek iş olarak yürütülür
+    query: str
+    indices: List[int]
+    messages: List[Dict[str, str]]
+    citations: List[str]
+    cache_key: AnswerKey
+    query_embedding: Optional[np.ndarray] = None
+    prompt_tokens: Optional[int] = None
+
+
+def _batch_results(
+    req: BatchChatRequest, indices: List[int], lang: str, content: str, citations: List[str], status: str,
+    prompt_tokens: Optional[int] = None,
+) -> List[BatchChatResult]:
+    return [
+        BatchChatResult(
+            index=i, query=req.queries[i], content=content, citations=citations, language=lang, status=status,
+            prompt_tokens=prompt_tokens,
         )
-    _save_message(session_id, "assistant", content)
-    return ChatResponse(session_id=session_id, content=content, citations=citations, language=lang)
+        for i in indices
+    ]
+
+
+def _prepare_batch(req: BatchChatRequest, generation: Hashable) -> Tuple[List[BatchChatResult], List[_BatchJob]]:
+    # Guardrails, önbellek, sorgu embedding'i ve retrieval tüm parti için toplu yapılır
+    lang = req.language if req.language != "auto" else "tr"
+    groups: Dict[AnswerKey, List[int]] = {}
+    texts: Dict[AnswerKey, str] = {}
+    categories: Dict[AnswerKey, Optional[List[str]]] = {}
+    verdicts: Dict[AnswerKey, GuardrailVerdict] = {}
+    for i, query in enumerate(req.queries):
+        text = query.strip()
+        verdict = classify_query(text)
+        cats = _categories_for(verdict)
+        key = make_answer_key(verdict.normalized, lang, cats, req.max_tokens, req.temperature, req.top_p)
+        if key not in groups:
+            texts[key], categories[key], verdicts[key] = text, cats, verdict
+        groups.setdefault(key, []).append(i)
+
+    ready: List[BatchChatResult] = []
+    pending: List[AnswerKey] = []
+    for key, indices in groups.items():
+        refusal = _guardrail_refusal(verdicts[key])
+        if refusal is not None:
+            ready.extend(_batch_results(req, indices, lang, refusal, [], "refused"))
+        else:
+            pending.append(key)
+
+    cache = get_answer_cache()
+    # Önce tam eşleşme; embedding yalnızca kalan sorular için (anlamsal katman açıksa) toplu hesaplanır
+    misses: List[AnswerKey] = []
+    for key in pending:
+        hit = cache.get_exact(key, generation) if cache is not None else None
+        if hit is not None:
+            ready.extend(_batch_results(req, groups[key], lang, hit.content, list(hit.citations), "cached"))
+        else:
+            misses.append(key)
+    embs = None
+    if cache is not None and cache.semantic_threshold is not None and misses:
+        embs = embed_queries([texts[key] for key in misses])
+    todo: List[Tuple[AnswerKey, Optional[np.ndarray]]] = []
+    for n, key in enumerate(misses):
+        emb = embs[n:n + 1] if embs is not None else None
+        hit = cache.get(key, generation, embedding=emb) if cache is not None else None
+        if hit is not None:
+            ready.extend(_batch_results(req, groups[key], lang, hit.content, list(hit.citations), "cached"))
+        else:
+            todo.append((key, emb))
+
+    hits_per_query = get_hybrid_retriever().retrieve_many(
+        [texts[key] for key, _emb in todo], k=get_settings().retrieval_k, allowed_categories=[categories[key] for key, _emb in todo]
+    )
+    jobs: List[_BatchJob] = []
+    for (key, emb), hits in zip(todo, hits_per_query):
+        messages, citations, prompt_tokens = _build_messages(lang, hits, texts[key], [])
+        jobs.append(_BatchJob(
+            query=texts[key], indices=groups[key], messages=messages, citations=citations, cache_key=key,
+            query_embedding=emb, prompt_tokens=prompt_tokens,
+        ))
+    return ready, jobs
+
+
+async def run_chat_batch(req: BatchChatRequest) -> AsyncIterator[BatchChatResult]:
+    """Answer many questions without sessions; yields one result per input query as answers complete.
+
+    Identical questions are answered once. LLM calls run with at most ``req.concurrency``
+    (default ``BATCH_LLM_CONCURRENCY``) in flight on the shared client.
+    """
+    settings = get_settings()
+    lang = req.language if req.language != "auto" else "tr"
+    generation = await run_in_threadpool(_index_generation)
+    ready, jobs = await run_in_threadpool(_prepare_batch, req, generation)
+    for result in ready:
+        yield result
+
+    client = get_llm_client()
+    cache = get_answer_cache()
+    limit = asyncio.Semaphore(max(1, req.concurrency or settings.batch_llm_concurrency))
+
+    async def answer(job: _BatchJob) -> Tuple[_BatchJob, str, str]:
+        async with limit:
+            try:
+                comp = await client.chat.completions.create(
+                    model=settings.model,
+                    messages=job.messages,
+                    temperature=req.temperature,
+                    top_p=req.top_p,
+                    max_tokens=clamp_max_tokens(req.max_tokens, job.prompt_tokens or 0),
+                    stream=False,
+                )
+                # Boş choices da bu işin hatası olarak raporlanır, tüm NDJSON cevabı kesilmez
+                content = clean_markdown_formatting(comp.choices[0].message.content or "")
+                finish_reason = comp.choices[0].finish_reason
+            except Exception as e:  # noqa: BLE001
+                return job, _llm_error_message(e), "error"
+        # Token sınırında kesilen cevap önbelleğe yazılmaz
+        if cache is not None and finish_reason == "stop":
+            cache.put(job.cache_key, generation, content, job.citations, embedding=job.query_embedding)
+        return job, content, "ok"
+
+    tasks = [asyncio.ensure_future(answer(job)) for job in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            job, content, status = await next_done
+            for result in _batch_results(req, job.indices, lang, content, job.citations, status, job.prompt_tokens):
+                yield result
+    finally:
+        # İstemci bağlantıyı koparırsa bekleyen LLM çağrılarını iptal et
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/chat/batch")
+async def chat_batch(req: BatchChatRequest) -> StreamingResponse:
+    settings = get_settings()
+    if len(req.queries) > settings.batch_max_queries:
+        raise HTTPException(status_code=413, detail=f"En fazla {settings.batch_max_queries} soru gönderilebilir")
+
+    async def lines() -> AsyncGenerator[bytes, None]:
+        async with aclosing(run_chat_batch(req)) as results:
+            async for result in results:
+                yield dumps(result.model_dump()) + b"\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -2,12 +2,14 @@
 from __future__ import annotations
 
 import os
-from typing import Any, List
+from typing import Any
 
-import fitz  # PyMuPDF
 from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 
-from ..retrieval.retriever import build_global_retriever, get_retriever
+from ..ingest.pdf_extract import extract_pdf
+from ..rag.vector_store import get_vector_store
+from ..retrieval.retriever import DATA_DIR, build_global_retriever
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 
@@ -19,22 +21,17 @@ def _save_upload(tmp_dir: str, up: UploadFile, category: str) -> str:
     with open(out_path, 'wb') as f:
         f.write(up.file.read())
     # move into category under data root
-    data_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
-    target_dir = os.path.join(data_root, category)
+    target_dir = os.path.join(DATA_DIR, category)
     os.makedirs(target_dir, exist_ok=True)
     final_path = os.path.join(target_dir, safe_name)
     os.replace(out_path, final_path)
     return final_path
 
 
-def _pdf_to_texts(pdf_path: str) -> List[str]:
-    texts: List[str] = []
-    with fitz.open(pdf_path) as doc:
-        for page in doc:
-            txt = page.get_text("text")
-            if txt:
-                texts.append(txt)
-    return texts
+def _rebuild_indexes() -> None:
+    # re-build retriever index and embed only the new/changed books' chunks
+    retriever = build_global_retriever()
+    get_vector_store().sync_with_retriever(retriever)
 
 
 @router.post('/pdf')
@@ -42,18 +39,18 @@ async def ingest_pdf(category: str, file: UploadFile = File(...)) -> Any:
     if not file.filename or not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail='PDF bekleniyor')
     # category: gizli-ilimler | kuran | hadis | havas | ...
-    saved = _save_upload('/tmp/irfan_uploads', file, category=category)
-    # extract and save as .txt alongside for retriever
-    texts = _pdf_to_texts(saved)
+    saved = await run_in_threadpool(_save_upload, '/tmp/irfan_uploads', file, category)
+    # extract and save as .txt alongside for retriever (page ranges in parallel, off the event loop)
     txt_path = saved.rsplit('.', 1)[0] + '.txt'
-    with open(txt_path, 'w', encoding='utf-8') as f:
-        f.write('\n\n'.join(texts))
-    # re-build retriever index
-    build_global_retriever()
-    return {"ok": True, "saved": saved, "txt": txt_path}
+    result = await run_in_threadpool(extract_pdf, saved, txt_path)
+    if not result.ok:
+        raise HTTPException(status_code=422, detail=f'PDF okunamadı: {result.error}')
+    # index rebuild and embedding run in the threadpool so open chat streams keep flowing
+    await run_in_threadpool(_rebuild_indexes)
+    return {"ok": True, "saved": saved, "txt": txt_path, "extract": result.as_dict()}
 
 
 @router.post('/reindex')
 async def reindex() -> Any:
-    build_global_retriever()
+    await run_in_threadpool(_rebuild_indexes)
     return {"ok": True}
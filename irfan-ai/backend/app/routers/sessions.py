@@ -2,11 +2,13 @@
 from __future__ import annotations
 
 import uuid
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 
+from ..config import get_settings
 from ..db import get_session
+from ..message_store import flush_all, flush_session, invalidate_history, list_messages
 from ..models import ChatSession, Message
 from ..schemas import MessageResponse, SessionCreate, SessionResponse
 
@@ -27,6 +29,7 @@ def create_session(body: SessionCreate) -> Any:
 @router.get("", response_model=List[SessionResponse])
 def list_sessions(user_id: str | None = None) -> Any:
     """List sessions, optionally filtered by user_id. Returns max 30 most recent."""
+    flush_all()
     with get_session() as db:
         query = db.query(ChatSession)
         if user_id:
@@ -37,6 +40,7 @@ def list_sessions(user_id: str | None = None) -> Any:
 
 @router.get("/{session_id}", response_model=SessionResponse)
 def get_session_info(session_id: str) -> Any:
+    flush_session(session_id)
     with get_session() as db:
         sess = db.get(ChatSession, session_id)
         if not sess:
@@ -45,17 +49,42 @@ def get_session_info(session_id: str) -> Any:
 
 
 @router.get("/{session_id}/messages", response_model=List[MessageResponse])
-def get_messages(session_id: str) -> Any:
+def get_messages(
+    session_id: str,
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1),
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+) -> Any:
+    """Keyset sayfalama: limit/before/after verilirse en yeni sayfadan başlar; eski mesajlar için
+    before=<ilk id>, yeniler için after=<son id>. Hiçbiri verilmezse tüm geçmiş döner (eski istemciler).
+
+    Sayfa kronolojik sıradadır. Aynı yönde devamı varsa X-Has-More: 1 ve X-Next-Cursor başlıkları döner.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="before ve after birlikte kullanılamaz")
+    settings = get_settings()
+    paged = limit is not None or before is not None or after is not None
+    page_size = min(limit or settings.messages_page_size, settings.messages_page_max) if paged else None
+    flush_session(session_id)
     with get_session() as db:
         sess = db.get(ChatSession, session_id)
         if not sess:
             raise HTTPException(status_code=404, detail="Oturum bulunamadı")
-        rows = db.query(Message).filter(Message.session_id == session_id).order_by(Message.created_at.asc()).all()
-        return [MessageResponse(id=r.id or 0, role=r.role, content=r.content, created_at=r.created_at) for r in rows]
+    try:
+        rows, has_more = list_messages(session_id, page_size, before=before, after=after)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci")
+    response.headers["X-Has-More"] = "1" if has_more else "0"
+    if has_more and rows:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id if after is not None else rows[0].id)
+    return [MessageResponse(id=r.id or 0, role=r.role, content=r.content, created_at=r.created_at) for r in rows]
 
 
 @router.delete("/{session_id}")
 def delete_session(session_id: str) -> Any:
+    # Kuyrukta bekleyen mesajlar silmeden sonra yazılmasın
+    flush_session(session_id)
     with get_session() as db:
         sess = db.get(ChatSession, session_id)
         if not sess:
@@ -63,15 +92,19 @@ def delete_session(session_id: str) -> Any:
         db.query(Message).filter(Message.session_id == session_id).delete()
         db.delete(sess)
         db.commit()
-        return {"ok": True}
+    invalidate_history(session_id)
+    return {"ok": True}
 
 
 @router.post("/{session_id}/reset")
 def reset_session(session_id: str) -> Any:
+    # Kuyrukta bekleyen mesajlar silmeden sonra yazılmasın
+    flush_session(session_id)
     with get_session() as db:
         sess = db.get(ChatSession, session_id)
         if not sess:
             raise HTTPException(status_code=404, detail="Oturum bulunamadı")
         db.query(Message).filter(Message.session_id == session_id).delete()
         db.commit()
-        return {"ok": True}
+    invalidate_history(session_id)
+    return {"ok": True}
@@ -35,6 +35,8 @@ class ChatRequest(BaseModel):
     temperature: float = 0.2
     top_p: float = 0.95
     max_tokens: int = 4096  # Daha uzun cevaplar için artırıldı
+    # SSE frame format: "json" ({"token","done"}) or "compact" ({"t"} / {"d","s","c"}) for mobile clients
+    stream_format: Literal["json", "compact"] = "json"
 
 
 class ChatChunk(BaseModel):
@@ -48,3 +50,25 @@ class ChatResponse(BaseModel):
     content: str
     citations: List[str] = Field(default_factory=list)
     language: Literal["both", "tr", "ar", "auto"] = "both"
+    prompt_tokens: Optional[int] = None  # LLM'e giden prompt boyutu (önbellek/ret cevaplarında yok)
+
+
+class BatchChatRequest(BaseModel):
+    # Toplu değerlendirme: oturum açılmaz, geçmiş kullanılmaz, mesajlar kaydedilmez
+    queries: List[str] = Field(min_length=1)
+    language: Literal["both", "tr", "ar", "auto"] = "both"
+    temperature: float = 0.2
+    top_p: float = 0.95
+    max_tokens: int = 4096
+    concurrency: Optional[int] = None  # Eşzamanlı LLM çağrısı; varsayılan BATCH_LLM_CONCURRENCY
+
+
+class BatchChatResult(BaseModel):
+    # NDJSON satırı; sonuçlar tamamlanma sırasıyla gelir, index istekteki sırayı verir
+    index: int
+    query: str
+    content: str
+    citations: List[str] = Field(default_factory=list)
+    language: Literal["both", "tr", "ar", "auto"] = "both"
+    status: Literal["ok", "cached", "refused", "error"] = "ok"
+    prompt_tokens: Optional[int] = None
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from .ingest.auto_ingest import convert_new_uploads
+from .rag.vector_store import init_vector_store
+from .retrieval.retriever import build_global_retriever
+
+
+class StartupState:
+    """Progress of the boot-time index warm-up, reported by /api/health and /api/ready."""
+
+    def __init__(self) -> None:
+        self.state = "idle"  # idle | warming | ready | failed
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def begin(self) -> bool:
+        with self._lock:
+            if self.state == "warming":
+                return False
+            self.state = "warming"
+            self.started_at = datetime.utcnow().isoformat() + "Z"
+            self.finished_at = None
+            self.error = None
+            self.steps = {}
+            self._done.clear()
+            return True
+
+    def record_step(self, name: str, info: Dict[str, Any]) -> None:
+        with self._lock:
+            self.steps[name] = info
+
+    def finish(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.state = "failed" if error else "ready"
+            self.error = error
+            self.finished_at = datetime.utcnow().isoformat() + "Z"
+        self._done.set()
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "steps": {name: dict(step) for name, step in self.steps.items()},
+                "error": self.error,
+            }
+
+
+_STATE = StartupState()
+
+
+def get_startup_state() -> StartupState:
+    return _STATE
+
+
+def _step(name: str, fn: Callable[[], Any], **describe: Callable[[Any], Any]) -> Any:
+    t0 = time.perf_counter()
+    result = fn()
+    info: Dict[str, Any] = {"ms": round((time.perf_counter() - t0) * 1000.0, 1)}
+    for key, get in describe.items():
+        info[key] = get(result)
+    _STATE.record_step(name, info)
+    return result
+
+
+def warm_up() -> None:
+    """Bring every persisted index up to date, each at most once.
+
+    1. Convert new/changed upload PDFs to text (no index work).
+    2. Load the retriever from its snapshot; only new/changed corpus files are tokenized.
+    3. Sync the vector store with it; skipped entirely when the corpus fingerprint matches the
+       published generation, otherwise only changed sources are embedded.
+    """
+    if not _STATE.begin():
+        return
+    try:
+        _step("uploads", convert_new_uploads, scanned=lambda r: r[0], converted=lambda r: r[1])
+        retriever = _step("retriever", build_global_retriever, chunks=lambda r: len(r._chunks))
+        _step(
+            "vector_index", lambda: init_vector_store().sync_with_retriever(retriever),
+            added=lambda r: r[0], removed=lambda r: r[1],
+        )
+    except Exception as e:
+        print(f"⚠️ Startup error (continuing anyway): {e}")
+        traceback.print_exc()
+        _STATE.finish(error=str(e))
+        return
+    _STATE.finish()
+    print("✅ Startup completed successfully!")
+
+
+def start_warm_up(background: bool = True) -> Optional[threading.Thread]:
+    """Run ``warm_up`` inline, or in a daemon thread so the server answers health checks meanwhile.
+
+    Requests arriving during the warm-up wait on the same builds (retriever build lock, vector store
+    lock) instead of starting their own.
+    """
+    if not background:
+        warm_up()
+        return None
+    thread = threading.Thread(target=warm_up, name="index-warmup", daemon=True)
+    thread.start()
+    return thread
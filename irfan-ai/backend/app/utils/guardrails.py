@@ -3,7 +3,11 @@ from __future__ import annotations
 
 import re
 import unicodedata
-from typing import Final
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Final, List, Optional, Sequence, Tuple
+
+from .aho_corasick import AhoCorasick
 
 
 # Very lightweight heuristics to flag common jailbreak patterns
@@ -17,9 +21,22 @@ INJECTION_PATTERNS: Final[list[re.Pattern[str]]] = [
     re.compile(r"jailbreak", re.I),
 ]
 
+# Literal triggers per injection pattern (same order): a pattern can only match text containing one
+# of them, so the classifier runs a pattern's regex only after the automaton has seen a trigger
+INJECTION_TRIGGERS: Final[list[tuple[str, ...]]] = [
+    ("ignore",),
+    ("disregard",),
+    ("reveal",),
+    ("dan",),
+    ("role", "system", "developer"),
+    ("pretend to be",),
+    ("jailbreak",),
+]
+
 # Arabic quick allow if any Arabic letter exists and known keywords occur
+ARABIC_KEYWORD_TERMS: Final[list[str]] = ["آية", "سورة", "تفسير", "حديث", "صحيح", "دعاء", "أذكار"]
 ARABIC_KEYWORDS: Final[list[re.Pattern[str]]] = [
-    re.compile(r"\b(آية|سورة|تفسير|حديث|صحيح|دعاء|أذكار)\b"),
+    re.compile(r"\b(" + "|".join(ARABIC_KEYWORD_TERMS) + r")\b"),
 ]
 
 # Normalized (ASCII-like) domain substrings to allow (religious scope)
@@ -55,6 +72,14 @@ SMALL_TALK_NORMALIZED: Final[list[str]] = [
     "maşallah", "masallah", "elhamdulillah", "elhamdülillah"
 ]
 
+# Retrieval category markers in priority order: the first group with a hit wins.
+# Group names are the keys of DOMAIN_CATS in routers/chat.py.
+CATEGORY_MARKERS: Final[list[tuple[str, list[str]]]] = [
+    ("gizli", ["gizli ilimler hazinesi", "mustafa iloglu", "havas", "ruhaniyat", "vird"]),
+    ("hadis", ["hadis", "bukhari", "muslim", "rivayet"]),
+    ("kuran", ["kuran", "ayet", "sure", "tefsir", "fatiha", "bakara", "nisa", "yasin"]),
+]
+
 
 def _normalize_for_matching(text: str) -> str:
     # Casefold to handle unicode case (İ -> i̇)
@@ -70,101 +95,271 @@ def _normalize_for_matching(text: str) -> str:
     return text.translate(trans)
 
 
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+@dataclass(frozen=True)
+class GuardrailVerdict:
+    normalized: str  # _normalize_for_matching(text), reusable by callers (e.g. cache keys)
+    injection: bool
+    allowed: bool  # religious scope, Arabic keyword or small talk
+    small_talk: bool
+    category: Optional[str]  # first CATEGORY_MARKERS group with a hit
+    matched: Tuple[str, ...]  # matched terms in text order
+
+
+class GuardrailClassifier:
+    """Domain, small-talk, category and injection checks in one pass over the normalized text.
+
+    Every keyword list is compiled (normalized like the input) into a single Aho-Corasick automaton;
+    adding keywords does not make classification slower. Substring semantics are those of the
+    original ``sub in norm`` scans; Arabic keywords additionally need word boundaries, and injection
+    regexes run only when one of their literal triggers was found.
+    """
+
+    def __init__(
+        self,
+        allowed: Sequence[str],
+        small_talk: Sequence[str],
+        category_markers: Sequence[Tuple[str, Sequence[str]]],
+        injection_patterns: Sequence[re.Pattern[str]],
+        injection_triggers: Sequence[Tuple[str, ...]],
+        arabic_terms: Sequence[str],
+    ) -> None:
+        self._injection = list(injection_patterns)
+        self._category_names = [name for name, _markers in category_markers]
+        patterns: List[Tuple[str, Tuple[str, int]]] = []
+        patterns += [(_normalize_for_matching(t), ("domain", 0)) for t in allowed]
+        patterns += [(_normalize_for_matching(t), ("small_talk", 0)) for t in small_talk]
+        patterns += [(_normalize_for_matching(t), ("arabic", 0)) for t in arabic_terms]
+        for rank, (_name, markers) in enumerate(category_markers):
+            patterns += [(_normalize_for_matching(t), ("category", rank)) for t in markers]
+        for idx, triggers in enumerate(injection_triggers):
+            patterns += [(_normalize_for_matching(t), ("injection", idx)) for t in triggers]
+        self._automaton = AhoCorasick(dict.fromkeys(patterns))
+
+    def classify(self, text: str) -> GuardrailVerdict:
+        norm = _normalize_for_matching(text)
+        domain = small_talk = False
+        category_rank: Optional[int] = None
+        triggered: set[int] = set()
+        matched: List[str] = []
+        for start, end, (kind, value) in self._automaton.iter_matches(norm):
+            if kind == "injection":
+                triggered.add(value)
+                continue
+            if kind == "arabic":
+                if (start > 0 and _is_word_char(norm[start - 1])) or (end < len(norm) and _is_word_char(norm[end])):
+                    continue
+                domain = True
+            elif kind == "domain":
+                domain = True
+            elif kind == "small_talk":
+                small_talk = True
+            elif category_rank is None or value < category_rank:
+                category_rank = value
+            term = norm[start:end]
+            if term not in matched:
+                matched.append(term)
+        injection = any(self._injection[idx].search(text) for idx in sorted(triggered))
+        return GuardrailVerdict(
+            normalized=norm,
+            injection=injection,
+            allowed=domain or small_talk,
+            small_talk=small_talk,
+            category=self._category_names[category_rank] if category_rank is not None else None,
+            matched=tuple(matched),
+        )
+
+
+@lru_cache(maxsize=1)
+def get_guardrail_classifier() -> GuardrailClassifier:
+    return GuardrailClassifier(
+        allowed=ALLOWED_NORMALIZED_SUBSTRINGS,
+        small_talk=SMALL_TALK_NORMALIZED,
+        category_markers=CATEGORY_MARKERS,
+        injection_patterns=INJECTION_PATTERNS,
+        injection_triggers=INJECTION_TRIGGERS,
+        arabic_terms=ARABIC_KEYWORD_TERMS,
+    )
+
+
+def classify_query(text: str) -> GuardrailVerdict:
+    return get_guardrail_classifier().classify(text)
+
+
 def has_prompt_injection(text: str) -> bool:
-    for pat in INJECTION_PATTERNS:
-        if pat.search(text):
-            return True
-    return False
+    return classify_query(text).injection
 
 
 def is_in_allowed_domain(text: str) -> bool:
-    # Arabic path
-    if re.search(r"[\u0600-\u06FF]", text):
-        for pat in ARABIC_KEYWORDS:
-            if pat.search(text):
-                return True
-    # Normalized substring path
-    norm = _normalize_for_matching(text)
-    if any(sub in norm for sub in ALLOWED_NORMALIZED_SUBSTRINGS):
-        return True
-    # Small talk allowance
-    if any(st in norm for st in SMALL_TALK_NORMALIZED):
-        return True
-    return False
+    return classify_query(text).allowed
 
 
-def clean_markdown_formatting(text: str) -> str:
-    """
-    LLM çıktısındaki markdown formatlarını (*, -, #, tablo, vb.) temizler.
-    Düz metin formatında net cevap döndürür.
-    """
-    if not text:
-        return text
-    
+def _clean_table_row(match: re.Match[str]) -> str:
+    # Pipe karakterlerini kaldır ve hücreleri temizle (| col1 | col2 | -> col1 col2)
+    cells = [cell.strip() for cell in match.group(0).split('|') if cell.strip()]
+    return ' '.join(cells) if cells else ''
+
+
+# clean_markdown_formatting adımları, uygulama sırasıyla: (desen, yerine konan, kapatıcı).
+# Kapatıcı, çift işaretli adımlar ve kod çiti içindir (akış temizleyicisi): metnin sonuna eklendiğinde sonuç
+# değişiyorsa açık kalmış bir işaret sonraki metinle eşleşebilir, o noktadan kesmek güvenli değildir.
+_MARKDOWN_STEPS: Final[list[tuple[re.Pattern[str], Any, str]]] = [
     # TABLO FORMATLARI TEMİZLEME (ÖNCELİKLİ)
     # Tablo ayırıcı satırlarını kaldır (|---|---|)
-    text = re.sub(r'^\s*\|[\s\-\:\|]+\|\s*$', '', text, flags=re.MULTILINE)
-    
-    # Tablo satırlarını normal metne çevir (| col1 | col2 | -> col1 col2)
-    def clean_table_row(match):
-        row = match.group(0)
-        # Pipe karakterlerini kaldır ve hücreleri temizle
-        cells = [cell.strip() for cell in row.split('|') if cell.strip()]
-        return ' '.join(cells) if cells else ''
-    
-    text = re.sub(r'^\s*\|.+\|\s*$', clean_table_row, text, flags=re.MULTILINE)
-    
+    (re.compile(r'^\s*\|[\s\-\:\|]+\|\s*$', re.MULTILINE), '', ''),
+    # Tablo satırlarını normal metne çevir
+    (re.compile(r'^\s*\|.+\|\s*$', re.MULTILINE), _clean_table_row, ''),
     # Kalan pipe karakterlerini temizle
-    text = text.replace('|', '')
-    
+    (re.compile(r'\|'), '', ''),
     # Başlıkları temizle (## Başlık -> Başlık)
-    text = re.sub(r'^#+\s*', '', text, flags=re.MULTILINE)
-    
+    (re.compile(r'^#+\s*', re.MULTILINE), '', ''),
     # Bold/italic yıldızları temizle (**, *, ___)
-    text = re.sub(r'\*\*\*([^\*]+)\*\*\*', r'\1', text)  # ***bold italic***
-    text = re.sub(r'\*\*([^\*]+)\*\*', r'\1', text)      # **bold**
-    text = re.sub(r'\*([^\*]+)\*', r'\1', text)           # *italic*
-    text = re.sub(r'__([^_]+)__', r'\1', text)            # __bold__
-    text = re.sub(r'_([^_]+)_', r'\1', text)              # _italic_
-    
+    (re.compile(r'\*\*\*([^\*]+)\*\*\*'), r'\1', '***'),  # ***bold italic***
+    (re.compile(r'\*\*([^\*]+)\*\*'), r'\1', '***'),      # **bold**
+    (re.compile(r'\*([^\*]+)\*'), r'\1', '***'),          # *italic*
+    (re.compile(r'__([^_]+)__'), r'\1', '__'),            # __bold__
+    (re.compile(r'_([^_]+)_'), r'\1', '__'),              # _italic_
     # Kalan yıldız ve tire karakterlerini temizle (satır başı/sonu)
-    text = re.sub(r'^\s*[\*\-]\s*', '', text, flags=re.MULTILINE)
-    
+    (re.compile(r'^\s*[\*\-]\s*', re.MULTILINE), '', ''),
     # Tire ile başlayan liste işaretlerini temizle
-    text = re.sub(r'^\s*[-•➤→]\s+', '', text, flags=re.MULTILINE)
-    
+    (re.compile(r'^\s*[-•➤→]\s+', re.MULTILINE), '', ''),
     # Numaralı liste formatlarını temizle (1. veya 1) veya 1:)
-    text = re.sub(r'^\s*\d+[\.\)\:]\s+', '', text, flags=re.MULTILINE)
-    
+    (re.compile(r'^\s*\d+[\.\)\:]\s+', re.MULTILINE), '', ''),
     # Kod bloklarını temizle (```)
-    text = re.sub(r'```[a-z]*\n', '', text)
-    text = re.sub(r'```', '', text)
-    
+    (re.compile(r'```[a-z]*\n'), '', '\n'),
+    (re.compile(r'```'), '', ''),
     # Inline kod işaretlerini temizle (`)
-    text = re.sub(r'`([^`]+)`', r'\1', text)
-    
+    (re.compile(r'`([^`]+)`'), r'\1', '`'),
     # Blockquote işaretlerini temizle (>)
-    text = re.sub(r'^\s*>\s+', '', text, flags=re.MULTILINE)
-    
+    (re.compile(r'^\s*>\s+', re.MULTILINE), '', ''),
     # Link formatlarını temizle [text](url) -> text
-    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
-    
+    (re.compile(r'\[([^\]]+)\]\([^\)]+\)'), r'\1', '](#)'),
     # Horizontal rule temizle (---, ***, ___)
-    text = re.sub(r'^[-*_]{3,}\s*$', '', text, flags=re.MULTILINE)
-    
+    (re.compile(r'^[-*_]{3,}\s*$', re.MULTILINE), '', ''),
     # Ekstra markdown karakterlerini temizle
-    text = re.sub(r'~~([^~]+)~~', r'\1', text)  # ~~strikethrough~~
-    
+    (re.compile(r'~~([^~]+)~~'), r'\1', '~~'),  # ~~strikethrough~~
     # Çoklu boşlukları temizle
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    text = re.sub(r' {2,}', ' ', text)  # Çoklu space'leri tek space yap
-    
-    # Satır başı/sonu boşluklarını temizle
-    text = text.strip()
-    
+    (re.compile(r'\n{3,}'), '\n\n', ''),
+    (re.compile(r' {2,}'), ' ', ''),  # Çoklu space'leri tek space yap
+]
+
+
+def _apply_markdown_steps(text: str, settled: bool = False) -> Optional[str]:
+    # settled=True: metnin sonunda açık kalmış bir işaret varsa None döner (bkz. MarkdownStreamCleaner)
+    for pattern, repl, closer in _MARKDOWN_STEPS:
+        cleaned = pattern.sub(repl, text)
+        if settled and closer and pattern.sub(repl, text + closer) != cleaned + closer:
+            return None
+        text = cleaned
     return text
 
 
+def clean_markdown_formatting(text: str) -> str:
+    """
+    LLM çıktısındaki markdown formatlarını (*, -, #, tablo, vb.) temizler.
+    Düz metin formatında net cevap döndürür.
+    """
+    if not text:
+        return text
+    # Satır başı/sonu boşluklarını temizle
+    return (_apply_markdown_steps(text) or '').strip()
+
+
+# Paired markers whose opener may still be waiting for its closer
+_STREAM_MARKERS: Final[str] = '*_`[~'
+
+
+class MarkdownStreamCleaner:
+    """Incremental ``clean_markdown_formatting`` for streamed text.
+
+    Deltas are buffered up to a cut point: any letter, used as lookahead, that is not on a table row
+    (those are cut at their start only) and has no paired marker (``*``, ``_``, `````, ``[``,
+    ``~``) or code fence left open before it, which each such step checks by re-running with a
+    closer appended. Line-anchored steps stop at a letter, so the current line's list or heading
+    prefix is settled once one follows; the buffered prefix is cleaned on its own and emitted, and
+    the concatenated output equals ``clean_markdown_formatting`` of the whole text. A cut is tried
+    whenever ``min_step`` more characters arrived; when it fails, the next candidate lies before the
+    last open marker. Trailing whitespace is held back until more text follows, for the final strip.
+    If no cut point turns up within ``max_buffer`` characters the buffer is cut at its last letter
+    anyway, so only a construct spanning more than that can come out differently.
+    """
+
+    def __init__(self, max_buffer: int = 4096, min_step: int = 32) -> None:
+        self.max_buffer = max(1, int(max_buffer))
+        self.min_step = max(1, int(min_step))
+        self._buf = ''
+        # Buffer length at the last cut attempt
+        self._tried = 0
+        self._started = False
+        self._pending_ws = ''
+
+    def feed(self, delta: str) -> str:
+        """Add a delta; returns the cleaned text that became final (possibly empty)."""
+        if not delta:
+            return ''
+        self._buf += delta
+        if len(self._buf) - self._tried < self.min_step:
+            return ''
+        cut = self._find_cut()
+        if cut is None and len(self._buf) > self.max_buffer:
+            pos = self._candidate(len(self._buf))
+            if pos > 0:
+                cut = pos, (_apply_markdown_steps(self._buf[:pos + 1]) or '')[:-1]
+        if cut is None:
+            self._tried = len(self._buf)
+            return ''
+        self._buf = self._buf[cut[0]:]
+        self._tried = len(self._buf)
+        return self._emit(cut[1])
+
+    def finish(self) -> str:
+        """Flush the buffer at the end of the stream; returns the remaining cleaned text."""
+        text, self._buf = self._buf, ''
+        out = self._emit(_apply_markdown_steps(text) or '') if text else ''
+        # Trailing whitespace still held back is what the final strip removes
+        self._pending_ws = ''
+        return out
+
+    def _candidate(self, end: int) -> int:
+        # Offset of the last letter before end that is not inside a table row (0 if none)
+        buf = self._buf
+        i = end - 1
+        while i > 0:
+            if buf[i].isalpha():
+                start = buf.rfind('\n', 0, i) + 1
+                if not buf[start:i].lstrip().startswith('|'):
+                    return i
+                i = start
+            i -= 1
+        return 0
+
+    def _find_cut(self) -> Optional[Tuple[int, str]]:
+        pos = self._candidate(len(self._buf))
+        for _ in range(3):
+            if pos <= 0:
+                return None
+            body = _apply_markdown_steps(self._buf[:pos + 1], settled=True)
+            if body is not None and body.endswith(self._buf[pos]):
+                return pos, body[:-1]
+            # Something is left open: retry before the last marker
+            pos = self._candidate(max(self._buf.rfind(m, 0, pos) for m in _STREAM_MARKERS))
+        return None
+
+    def _emit(self, body: str) -> str:
+        if not self._started:
+            body = body.lstrip()
+            if not body:
+                return ''
+            self._started = True
+        text = self._pending_ws + body
+        kept = text.rstrip()
+        self._pending_ws = text[len(kept):]
+        return kept
+
+
 SYSTEM_POLICY_PROMPT: Final[str] = (
     """
 Senin adın Irfan. Sadece şu kaynaklardan hareketle cevap ver:
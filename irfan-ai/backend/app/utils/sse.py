@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+try:  # orjson is optional; the stdlib encoder produces the same frames, only slower
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+
+STREAM_FORMATS = ("json", "compact")
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class SSEEncoder:
+    """Encodes chat stream events as SSE ``data:`` frames.
+
+    ``json`` keeps the original payload keys (``token``/``done``/``session_id``/``citations``/``error``);
+    ``compact`` uses single-letter keys (``t``/``d``/``s``/``c``/``e``) and omits ``done: false``
+    on token frames.
+    """
+
+    def __init__(self, fmt: str = "json") -> None:
+        self.compact = fmt == "compact"
+
+    @staticmethod
+    def _frame(payload: Dict[str, Any]) -> bytes:
+        return b"data: " + dumps(payload) + b"\n\n"
+
+    def token(self, text: str) -> bytes:
+        if self.compact:
+            return self._frame({"t": text})
+        return self._frame({"token": text, "done": False})
+
+    def done(self, session_id: str, citations: List[str]) -> bytes:
+        if self.compact:
+            return self._frame({"d": 1, "s": session_id, "c": citations})
+        return self._frame({"token": "", "done": True, "session_id": session_id, "citations": citations})
+
+    def error(self, message: str) -> bytes:
+        if self.compact:
+            return self._frame({"e": message})
+        return self._frame({"error": message})
+
+
+async def coalesce(deltas: AsyncIterator[str], flush_interval: float, max_chars: int) -> AsyncIterator[str]:
+    """Merge small upstream deltas into larger chunks.
+
+    A chunk is emitted once it holds ``max_chars`` characters or its oldest delta has waited
+    ``flush_interval`` seconds, even while upstream is silent. The first delta is passed through
+    immediately so time-to-first-token is unchanged. ``flush_interval <= 0`` disables merging.
+    """
+    it = deltas.__aiter__()
+    if flush_interval <= 0:
+        async for delta in it:
+            yield delta
+        return
+
+    first = True
+    buf: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    # The pending __anext__ is awaited through a task so a flush timeout never cancels the upstream read
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield "".join(buf)
+                buf, size, deadline = [], 0, None
+                continue
+            task, pending = pending, None
+            try:
+                delta = task.result()
+            except StopAsyncIteration:
+                break
+            if first:
+                first = False
+                yield delta
+                continue
+            buf.append(delta)
+            size += len(delta)
+            if deadline is None:
+                deadline = time.monotonic() + flush_interval
+            if max_chars > 0 and size >= max_chars:
+                yield "".join(buf)
+                buf, size, deadline = [], 0, None
+        if buf:
+            yield "".join(buf)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import zlib
+
+import numpy as np
+
+from backend.app.rag.embedding_cache import EmbeddingCache
+
+DIM = 8
+
+
+def _vectors(texts):
+    # One distinct vector per text, derived from the text itself
+    return np.stack([np.random.default_rng(zlib.crc32(t.encode())).standard_normal(DIM).astype('float32') for t in texts])
+
+
+def _check(cache, texts):
+    vecs, hit = cache.get_many([cache.make_key(t) for t in texts])
+    assert hit.all()
+    np.testing.assert_array_equal(vecs, _vectors(texts))
+
+
+def test_caches_sharing_a_directory_never_mix_up_rows(tmp_path):
+    # Two worker processes appending to the same cache files
+    first = EmbeddingCache(str(tmp_path), 'model')
+    second = EmbeddingCache(str(tmp_path), 'model')
+    a = [f'birinci {i}' for i in range(30)]
+    b = [f'ikinci metin {i}' for i in range(50)]
+    first.put_many([first.make_key(t) for t in a[:10]], _vectors(a[:10]))
+    second.put_many([second.make_key(t) for t in b[:25]], _vectors(b[:25]))
+    first.put_many([first.make_key(t) for t in a[10:]], _vectors(a[10:]))
+    second.put_many([second.make_key(t) for t in b[25:]], _vectors(b[25:]))
+
+    for cache in (first, second, EmbeddingCache(str(tmp_path), 'model')):
+        _check(cache, a + b)
+        assert len(cache) == len(a) + len(b)
+
+
+def test_compaction_in_one_process_is_picked_up_by_the_other(tmp_path):
+    first = EmbeddingCache(str(tmp_path), 'model', max_entries=40)
+    second = EmbeddingCache(str(tmp_path), 'model', max_entries=40)
+    old = [f'eski {i}' for i in range(30)]
+    new = [f'yeni metin {i}' for i in range(20)]
+    second.put_many([second.make_key(t) for t in old], _vectors(old))
+    first.put_many([first.make_key(t) for t in new], _vectors(new))
+
+    _check(second, new)
+    vecs, hit = second.get_many([second.make_key(t) for t in old])
+    assert hit.sum() == len(first) - len(new)
+    if vecs is not None:
+        np.testing.assert_array_equal(vecs, _vectors([t for t, h in zip(old, hit) if h]))
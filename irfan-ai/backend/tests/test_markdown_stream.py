@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from backend.app.utils.guardrails import MarkdownStreamCleaner, clean_markdown_formatting
+
+
+def _stream(text, size=4):
+    cleaner = MarkdownStreamCleaner()
+    parts = [cleaner.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return parts, cleaner.finish()
+
+
+def test_long_paragraph_streams_before_finish():
+    text = ' '.join(['Fatiha suresi **yedi** ayettir ve *namazın* her rekatında okunur.'] * 16)
+    parts, tail = _stream(text)
+    streamed = ''.join(parts)
+    assert streamed + tail == clean_markdown_formatting(text)
+    assert len(streamed) > len(text) // 2
+    assert sum(1 for p in parts if p) > 10
+    assert len(tail) < 64
+
+
+def test_numbered_list_streams_before_finish():
+    text = '\n'.join(f'{n}. Madde {n}: Bu **önemli** bir açıklamadır ve devam eder.' for n in range(1, 21))
+    parts, tail = _stream(text)
+    streamed = ''.join(parts)
+    assert streamed + tail == clean_markdown_formatting(text)
+    # The first item comes out while the list is still streaming, without its "1. " prefix
+    first = next(i for i, p in enumerate(parts) if p)
+    assert first * 4 < 64
+    assert streamed.startswith('Madde 1:')
+    assert len(tail) < 64
+
+
+def test_open_marker_is_held_back():
+    cleaner = MarkdownStreamCleaner()
+    out = cleaner.feed('Bu cümlede **kalın kısım henüz kapanmadı ve devam ediyor')
+    # Everything before the open marker goes out, nothing after it
+    assert out and 'Bu cümlede'.startswith(out)
+    out += cleaner.feed('** bitti.') + cleaner.finish()
+    assert out == 'Bu cümlede kalın kısım henüz kapanmadı ve devam ediyor bitti.'
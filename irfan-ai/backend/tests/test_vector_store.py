@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from backend.app.rag import vector_store
+from backend.app.rag.ann import AnnConfig
+from backend.app.retrieval.retriever import DocumentChunk
+
+DIM = 32
+
+
+@pytest.fixture()
+def random_embeddings(monkeypatch):
+    # Deterministic unit vectors per text instead of the sentence-transformers model
+    table = {}
+    rng = np.random.default_rng(0)
+
+    def embed(texts):
+        out = []
+        for t in texts:
+            if t not in table:
+                v = rng.standard_normal(DIM).astype('float32')
+                table[t] = v / np.linalg.norm(v)
+            out.append(table[t])
+        return np.stack(out)
+
+    monkeypatch.setattr(vector_store, 'embed_texts', embed)
+    monkeypatch.setattr(vector_store, 'embed_queries', embed)
+    monkeypatch.setattr(vector_store, 'embed_query', lambda q: embed([q]))
+    monkeypatch.setattr(vector_store, 'cached_embeddings', lambda texts: (embed(texts), np.ones(len(texts), dtype=bool)))
+
+
+@pytest.mark.parametrize('quantization', ['none', 'fp16'])
+def test_filtered_hnsw_returns_min_k_partition(tmp_path, random_embeddings, quantization):
+    store = vector_store.FaissVectorStore(
+        str(tmp_path),
+        AnnConfig(kind='hnsw', min_size=0, quantization=quantization, hnsw_m=8, hnsw_ef_search=16),
+    )
+    sizes = {'tiny': 3, 'small': 40, 'medium': 800, 'large': 3000}
+    chunks = [DocumentChunk(f'genel {i}', f'genel{i // 100}.txt', str(i), 'hadis') for i in range(8000)]
+    for cat, size in sizes.items():
+        chunks += [DocumentChunk(f'{cat} {i}', f'{cat}.txt', str(i), cat) for i in range(size)]
+    store.add_source(chunks)
+
+    k = 5
+    for cat, size in sizes.items():
+        for q in range(20):
+            hits = store.search_ids(f'soru {q}', k=k, allowed_categories=[cat])
+            assert len(hits) == min(k, size)
+            assert all(meta.category == cat for _vid, meta, _score in hits)
+
+
+def _sources(store):
+    return sorted({meta.source for _vid, meta, _score in store.search_ids('soru', k=10)})
+
+
+def test_stores_sharing_a_directory_follow_each_other(tmp_path, random_embeddings):
+    # Two worker processes serving the same index directory
+    first = vector_store.FaissVectorStore(str(tmp_path), AnnConfig())
+    second = vector_store.FaissVectorStore(str(tmp_path), AnnConfig())
+    assert _sources(second) == []
+
+    first.add_source([DocumentChunk('bir', 'a.txt', '0', 'kuran')])
+    generation = second.generation
+    assert _sources(second) == ['a.txt']
+
+    # Built on the generation the first store published, not on the empty one it served before
+    second.add_source([DocumentChunk('iki', 'b.txt', '0', 'hadis')])
+    assert _sources(first) == ['a.txt', 'b.txt']
+    assert second.generation != generation
+
+    first.remove_source('a.txt')
+    assert _sources(second) == ['b.txt']